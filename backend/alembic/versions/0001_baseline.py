@@ -0,0 +1,159 @@
+"""Baseline: the schema previously created by Base.metadata.create_all
+
+Databases created that way already match this revision; scripts/stamp_baseline.py
+(run by the backend image before upgrading) marks them as 0001 so that
+``alembic upgrade head`` only applies the later migrations.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-06-01 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("username", sa.String(length=100), nullable=False),
+        sa.Column("full_name", sa.String(length=255), nullable=True),
+        sa.Column("hashed_password", sa.String(length=255), nullable=True),
+        sa.Column("avatar_url", sa.String(length=500), nullable=True),
+        sa.Column("google_id", sa.String(length=100), nullable=True),
+        sa.Column("is_oauth", sa.Boolean(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("is_verified", sa.Boolean(), nullable=True),
+        sa.Column("credits", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("last_login", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("google_id"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "chat_groups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("avatar_url", sa.String(length=500), nullable=True),
+        sa.Column("is_private", sa.Boolean(), nullable=True),
+        sa.Column("invite_code", sa.String(length=50), nullable=True),
+        sa.Column("max_members", sa.Integer(), nullable=True),
+        sa.Column("ai_enabled", sa.Boolean(), nullable=True),
+        sa.Column("ai_model", sa.String(length=50), nullable=True),
+        sa.Column("creator_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["creator_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("invite_code"),
+    )
+    op.create_index("ix_chat_groups_id", "chat_groups", ["id"])
+
+    op.create_table(
+        "group_members",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("joined_at", sa.DateTime(), nullable=True),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(["group_id"], ["chat_groups.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "group_id"),
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("message_type", sa.String(length=50), nullable=True),
+        sa.Column("is_ai_message", sa.Boolean(), nullable=True),
+        sa.Column("ai_model_used", sa.String(length=50), nullable=True),
+        sa.Column("credits_used", sa.Float(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("reply_to_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["group_id"], ["chat_groups.id"]),
+        sa.ForeignKeyConstraint(["reply_to_id"], ["messages.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+
+    op.create_table(
+        "group_invitations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("invitation_code", sa.String(length=100), nullable=False),
+        sa.Column("is_used", sa.Boolean(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("invited_by_id", sa.Integer(), nullable=False),
+        sa.Column("used_by_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("used_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["group_id"], ["chat_groups.id"]),
+        sa.ForeignKeyConstraint(["invited_by_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["used_by_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("invitation_code"),
+    )
+    op.create_index("ix_group_invitations_id", "group_invitations", ["id"])
+
+    op.create_table(
+        "notifications",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(length=50), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("message", sa.String(length=1000), nullable=False),
+        sa.Column("data", sa.Text(), nullable=True),
+        sa.Column("is_read", sa.Boolean(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("related_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("read_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_notifications_id", "notifications", ["id"])
+
+    op.create_table(
+        "credit_transactions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("transaction_type", sa.String(length=20), nullable=False),
+        sa.Column("description", sa.String(length=500), nullable=True),
+        sa.Column("ai_model", sa.String(length=50), nullable=True),
+        sa.Column("message_id", sa.Integer(), nullable=True),
+        sa.Column("payment_id", sa.String(length=100), nullable=True),
+        sa.Column("payment_status", sa.String(length=20), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["message_id"], ["messages.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_credit_transactions_id", "credit_transactions", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("credit_transactions")
+    op.drop_table("notifications")
+    op.drop_table("group_invitations")
+    op.drop_table("messages")
+    op.drop_table("group_members")
+    op.drop_table("chat_groups")
+    op.drop_table("users")
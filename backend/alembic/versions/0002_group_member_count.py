@@ -0,0 +1,30 @@
+"""Denormalized chat_groups.member_count, backfilled from group_members
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-06-01 00:00:01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chat_groups") as batch_op:
+        batch_op.add_column(sa.Column("member_count", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute(
+        "UPDATE chat_groups SET member_count = ("
+        "SELECT COUNT(*) FROM group_members WHERE group_members.group_id = chat_groups.id"
+        ")"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat_groups") as batch_op:
+        batch_op.drop_column("member_count")
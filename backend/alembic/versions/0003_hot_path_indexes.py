@@ -0,0 +1,33 @@
+"""Composite indexes for the hottest predicates
+
+- messages(group_id, created_at, id): keyset history pages
+- notifications(user_id, is_read, created_at): unread lists and counts
+- group_members(group_id): member lookups (the primary key leads with user_id)
+
+Invitation checks filter on (invitation_code, email, is_used, expires_at) but
+are already served by the unique index on invitation_code, which narrows the
+lookup to one row; a wider index would only add write cost.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-06-01 00:00:02
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_messages_group_created_id", "messages", ["group_id", "created_at", "id"])
+    op.create_index("ix_notifications_user_read_created", "notifications", ["user_id", "is_read", "created_at"])
+    op.create_index("ix_group_members_group_id", "group_members", ["group_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_group_members_group_id", table_name="group_members")
+    op.drop_index("ix_notifications_user_read_created", table_name="notifications")
+    op.drop_index("ix_messages_group_created_id", table_name="messages")
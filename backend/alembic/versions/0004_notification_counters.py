@@ -0,0 +1,36 @@
+"""Denormalized per-user notification counters, backfilled from notifications
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-06-01 00:00:03
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("notification_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("unread_notification_count", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute(
+        "UPDATE users SET "
+        "notification_count = ("
+        "SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id"
+        "), "
+        "unread_notification_count = ("
+        "SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id AND NOT notifications.is_read"
+        ")"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("unread_notification_count")
+        batch_op.drop_column("notification_count")
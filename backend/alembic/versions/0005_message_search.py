@@ -0,0 +1,70 @@
+"""Full-text index over message content
+
+- SQLite: an external-content FTS5 table (messages_fts) over messages.content,
+  kept in sync by insert/update/delete triggers and rebuilt from the table
+- Postgres: a GIN index on to_tsvector('simple', content); the expression is
+  matched by app.services.message_search, so it must stay identical there
+
+The 'simple' configuration lowercases and splits words without stemming or
+stop words, which suits short multilingual chat messages. On a large
+Postgres table create the index by hand first with CREATE INDEX CONCURRENTLY
+(same name and expression) so the migration does not hold a write lock while
+it builds; IF NOT EXISTS then makes this step a no-op.
+
+On SQLite a later batch_alter_table("messages") recreates the table and drops
+the triggers, so such a migration has to create them again.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-06-01 00:00:04
+"""
+from alembic import op
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'"
+            ")"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+            "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+            "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+            "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+            "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); "
+            "END"
+        )
+        op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_messages_content_search ON messages "
+            "USING gin (to_tsvector('simple', content))"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_messages_content_search")
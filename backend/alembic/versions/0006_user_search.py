@@ -0,0 +1,40 @@
+"""Indexes for user search
+
+- users(updated_at): lets the per-worker in-memory search index used on SQLite
+  pick up changed users without scanning the table
+- Postgres: pg_trgm and a GiST trigram index on the lowercased
+  "username full_name email" text; the expression is matched by
+  app.services.user_search, so it must stay identical there. GiST rather than
+  GIN so the nearest matches can be read in distance order (ORDER BY <<->)
+
+CREATE EXTENSION needs a role allowed to create it; on managed databases
+enable pg_trgm once by hand if the migration user cannot.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-06-01 00:00:05
+"""
+from alembic import op
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_updated_at", "users", ["updated_at"])
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gist ("
+            "(lower(username || ' ' || coalesce(full_name, '') || ' ' || email)) gist_trgm_ops"
+            ")"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_users_search_trgm")
+    op.drop_index("ix_users_updated_at", table_name="users")
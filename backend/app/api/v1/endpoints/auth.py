@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token, verify_token
+from app.core.dependencies import get_current_user
+from app.core.security import verify_password, get_password_hash, create_access_token
 from app.core.config import settings
 from app.models import User
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token, GoogleAuthRequest, GoogleTokenRequest
@@ -14,7 +14,6 @@ from google.oauth2 import id_token
 import logging
 
 router = APIRouter()
-security = HTTPBearer()
 
 logger = logging.getLogger(__name__)
 
@@ -201,32 +200,6 @@ async def google_auth(request: GoogleAuthRequest, db: AsyncSession = Depends(get
     }
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    token = credentials.credentials
-    payload = verify_token(token)
-    
-    user_id = payload.get("sub")
-    if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
-        )
-    
-    user_service = UserService(db)
-    user = await user_service.get_user_by_id(int(user_id))
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
-    
-    return user
-
-
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_profile(current_user: User = Depends(get_current_user)):
     """Get current user profile"""
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from app.core.database import get_db
-from app.core.dependencies import get_current_user
+from app.core.dependencies import get_current_principal, get_current_user
 from app.services.user_service import UserService
 from app.models import User
+from app.schemas.user import UserPrincipal
 from app.core.config import settings
 
 router = APIRouter()
@@ -22,8 +23,7 @@ class CreditsUpdateRequest(BaseModel):
 
 @router.get("/", response_model=CreditsResponse)
 async def get_user_credits(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Get user's current credit information"""
     return CreditsResponse(
@@ -40,8 +40,8 @@ async def get_user_credits(
 @router.post("/add")
 async def add_credits(
     request: CreditsUpdateRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Add credits to user account (admin function)"""
     user_service = UserService(db)
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from app.core.database import get_db
-from app.core.dependencies import get_current_user
-from app.models import User, ChatGroup, GroupMember, GroupInvitation, Message
+from app.core.database import get_db, get_read_only_db
+from app.core.dependencies import get_current_principal, get_read_db
+from app.models import User, ChatGroup, GroupMember, GroupInvitation
+from app.schemas.user import UserPrincipal
+from app.services.group_service import GroupService
+from app.services.message_ingest import message_ingest
+from app.services.message_service import MessageService
 from app.services.notification_service import NotificationService
 from app.services.email_service import email_service
 from app.services.websocket_manager import manager
@@ -32,6 +36,11 @@ class SendMessageRequest(BaseModel):
     content: str
 
 
+class AnnouncementRequest(BaseModel):
+    title: str = Field(..., min_length=1, max_length=255)
+    message: str = Field(..., min_length=1, max_length=1000)
+
+
 class GroupResponse(BaseModel):
     id: int
     name: str
@@ -45,6 +54,10 @@ class GroupResponse(BaseModel):
     ai_model: Optional[str]
 
 
+class GroupPresenceResponse(BaseModel):
+    online: Dict[int, List[int]]  # group_id -> online member ids
+
+
 class MessageResponse(BaseModel):
     id: int
     content: str
@@ -55,48 +68,73 @@ class MessageResponse(BaseModel):
     created_at: str
 
 
+def _group_response(group: ChatGroup, current_user_id: int) -> GroupResponse:
+    return GroupResponse(
+        id=group.id,
+        name=group.name,
+        description=group.description,
+        created_by=group.creator_id,
+        created_at=group.created_at.isoformat(),
+        member_count=group.member_count,
+        is_owner=group.creator_id == current_user_id,
+        is_private=group.is_private,
+        ai_enabled=group.ai_enabled,
+        ai_model=group.ai_model
+    )
+
+
 @router.get("/", response_model=List[GroupResponse])
 async def get_user_groups(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[int] = None,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get groups user belongs to"""
-    # Query groups where user is member
-    stmt = select(ChatGroup).join(GroupMember).where(
-        GroupMember.user_id == current_user.id
+    """Get groups user belongs to
+    
+    Without a limit every group is returned. With one, groups are ordered by
+    id and the X-Next-Cursor header holds the cursor for the next page.
+    """
+    group_service = GroupService(db)
+    # One extra row tells us whether another page exists
+    groups = await group_service.get_user_groups(
+        current_user.id,
+        limit=limit + 1 if limit else None,
+        after_id=cursor
     )
-    result_groups = await db.execute(stmt)
-    groups = result_groups.scalars().all()
-    
-    result = []
-    for group in groups:
-        # Count members for each group
-        count_stmt = select(func.count(GroupMember.user_id)).where(
-            GroupMember.group_id == group.id
+    if limit and len(groups) > limit:
+        groups = groups[:limit]
+        response.headers["X-Next-Cursor"] = str(groups[-1].id)
+    
+    return [_group_response(group, current_user.id) for group in groups]
+
+
+@router.get("/presence", response_model=GroupPresenceResponse)
+async def get_groups_presence(
+    group_ids: List[int] = Query(...),
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get online members for several groups in one call"""
+    # Only report on groups the user belongs to
+    membership_stmt = select(GroupMember.group_id).where(
+        and_(
+            GroupMember.user_id == current_user.id,
+            GroupMember.group_id.in_(group_ids)
         )
-        count_result = await db.execute(count_stmt)
-        member_count = count_result.scalar()
-        
-        result.append(GroupResponse(
-            id=group.id,
-            name=group.name,
-            description=group.description,
-            created_by=group.creator_id,
-            created_at=group.created_at.isoformat(),
-            member_count=member_count,
-            is_owner=group.creator_id == current_user.id,
-            is_private=group.is_private,
-            ai_enabled=group.ai_enabled,
-            ai_model=group.ai_model
-        ))
-    
-    return result
+    )
+    membership_result = await db.execute(membership_stmt)
+    allowed_group_ids = list(membership_result.scalars().all())
+    
+    online = await manager.presence.get_online_members(db, allowed_group_ids)
+    return GroupPresenceResponse(online=online)
 
 
 @router.post("/", response_model=GroupResponse)
 async def create_group(
     request: CreateGroupRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new chat group"""
@@ -108,6 +146,7 @@ async def create_group(
         is_private=request.is_private or False,
         ai_enabled=request.ai_enabled or False,
         ai_model=request.ai_model if request.ai_enabled else None,
+        member_count=1,
         created_at=datetime.utcnow()
     )
     db.add(new_group)
@@ -122,25 +161,14 @@ async def create_group(
     db.add(membership)
     await db.commit()
     
-    return GroupResponse(
-        id=new_group.id,
-        name=new_group.name,
-        description=new_group.description,
-        created_by=new_group.creator_id,
-        created_at=new_group.created_at.isoformat(),
-        member_count=1,
-        is_owner=True,
-        is_private=new_group.is_private,
-        ai_enabled=new_group.ai_enabled,
-        ai_model=new_group.ai_model
-    )
+    return _group_response(new_group, current_user.id)
 
 
 @router.post("/{group_id}/invite")
 async def invite_user_to_group(
     group_id: int,
     request: InviteUserRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Invite user to group"""
@@ -236,7 +264,7 @@ async def invite_user_to_group(
 @router.post("/join/{invitation_code}")
 async def join_group_by_invitation(
     invitation_code: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Join group using invitation code"""
@@ -266,12 +294,7 @@ async def join_group_by_invitation(
         raise HTTPException(status_code=400, detail="You are already a member of this group")
     
     # Add user to group
-    membership = GroupMember(
-        user_id=current_user.id,
-        group_id=invitation.group_id,
-        joined_at=datetime.utcnow()
-    )
-    db.add(membership)
+    await GroupService(db).add_member(invitation.group_id, current_user.id)
     
     # Mark invitation as used
     invitation.is_used = True
@@ -293,7 +316,7 @@ async def join_group_by_invitation(
 @router.post("/invitations/{invitation_id}/accept")
 async def accept_group_invitation(
     invitation_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Accept group invitation by invitation ID"""
@@ -323,12 +346,7 @@ async def accept_group_invitation(
         raise HTTPException(status_code=400, detail="You are already a member of this group")
     
     # Add user to group
-    membership = GroupMember(
-        user_id=current_user.id,
-        group_id=invitation.group_id,
-        joined_at=datetime.utcnow()
-    )
-    db.add(membership)
+    await GroupService(db).add_member(invitation.group_id, current_user.id)
     
     # Mark invitation as used
     invitation.is_used = True
@@ -352,7 +370,7 @@ async def accept_group_invitation(
 @router.get("/invitations/check/{invitation_code}")
 async def check_invitation(
     invitation_code: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_only_db)
 ):
     """Check if invitation code is valid"""
     invitation_stmt = select(GroupInvitation).where(
@@ -391,7 +409,7 @@ async def check_invitation(
 @router.post("/invitations/{invitation_code}/join")
 async def join_group_by_code(
     invitation_code: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Join group using invitation code (for new users who just registered)"""
@@ -421,12 +439,7 @@ async def join_group_by_code(
         raise HTTPException(status_code=400, detail="You are already a member of this group")
     
     # Add user to group
-    membership = GroupMember(
-        user_id=current_user.id,
-        group_id=invitation.group_id,
-        joined_at=datetime.utcnow()
-    )
-    db.add(membership)
+    await GroupService(db).add_member(invitation.group_id, current_user.id)
     
     # Mark invitation as used
     invitation.is_used = True
@@ -447,48 +460,120 @@ async def join_group_by_code(
     }
 
 
-@router.get("/{group_id}/messages", response_model=List[MessageResponse])
-async def get_group_messages(
+@router.post("/{group_id}/leave")
+async def leave_group(
     group_id: int,
-    limit: int = 50,
-    offset: int = 0,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get messages from a specific group"""
-    # Check if user is member of group
-    membership_stmt = select(GroupMember).where(
+    """Leave a group"""
+    group_stmt = select(ChatGroup).where(ChatGroup.id == group_id)
+    group_result = await db.execute(group_stmt)
+    group = group_result.scalar_one_or_none()
+    
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    
+    if group.creator_id == current_user.id:
+        raise HTTPException(status_code=400, detail="The group owner cannot leave the group")
+    
+    if not await GroupService(db).remove_member(group_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Not a member of this group")
+    
+    await db.commit()
+    
+    return {
+        "message": f"Left group '{group.name}'",
+        "group_id": group.id
+    }
+
+
+@router.post("/{group_id}/announcements")
+async def announce_to_group(
+    group_id: int,
+    request: AnnouncementRequest,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Send a notification to every other member of a group (group owner only)"""
+    group_stmt = select(ChatGroup).where(ChatGroup.id == group_id)
+    group_result = await db.execute(group_stmt)
+    group = group_result.scalar_one_or_none()
+    
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    
+    if group.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the group owner can send announcements")
+    
+    members_stmt = select(GroupMember.user_id).where(
         and_(
-            GroupMember.user_id == current_user.id,
-            GroupMember.group_id == group_id
+            GroupMember.group_id == group_id,
+            GroupMember.user_id != current_user.id
         )
     )
-    membership_result = await db.execute(membership_stmt)
-    membership = membership_result.scalar_one_or_none()
+    members_result = await db.execute(members_stmt)
+    
+    # One multi-row insert and one event per member, however large the group
+    notified = await NotificationService(db).create_group_announcement_notifications(
+        members_result.scalars().all(),
+        group_id=group.id,
+        group_name=group.name,
+        announced_by_name=current_user.full_name or current_user.username,
+        title=request.title,
+        message=request.message
+    )
     
-    if not membership:
+    return {
+        "message": f"Announcement sent to {notified} members of '{group.name}'",
+        "group_id": group.id,
+        "notified": notified
+    }
+
+
+@router.get("/{group_id}/messages", response_model=List[MessageResponse])
+async def get_group_messages(
+    group_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    offset: int = 0,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get messages from a specific group, newest first
+    
+    Pass the X-Next-Cursor header of a page as ``before`` to load older
+    messages, or as ``after`` when it came from an ``after`` page to keep
+    loading newer ones. The header is only set when more messages remain.
+    """
+    message_service = MessageService(db)
+    
+    # Check if user is member of group
+    if not await message_service.is_group_member(current_user.id, group_id):
         raise HTTPException(status_code=403, detail="Not a member of this group")
     
-    # Get messages
-    messages_stmt = select(Message).join(User, Message.user_id == User.id, isouter=True).where(
-        Message.group_id == group_id
-    ).order_by(Message.created_at.desc()).limit(limit).offset(offset)
-    
-    messages_result = await db.execute(messages_stmt)
-    messages = messages_result.scalars().all()
-    
-    result = []
-    for msg in messages:
-        # Get sender info if exists
-        sender_username = None
-        if msg.user_id:
-            sender_stmt = select(User).where(User.id == msg.user_id)
-            sender_result = await db.execute(sender_stmt)
-            sender = sender_result.scalar_one_or_none()
-            if sender:
-                sender_username = sender.username
-        
-        result.append(MessageResponse(
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    try:
+        before_key = MessageService.decode_cursor(before) if before else None
+        after_key = MessageService.decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # One extra row tells us whether another page exists
+    rows = await message_service.get_group_messages(
+        group_id, limit + 1, before=before_key, after=after_key, offset=offset
+    )
+    if len(rows) > limit:
+        # Drop the row furthest from the cursor; the next page starts after the last kept one
+        rows = rows[1:] if after_key else rows[:limit]
+        edge = rows[0][0] if after_key else rows[-1][0]
+        response.headers["X-Next-Cursor"] = MessageService.encode_cursor(edge)
+    
+    return [
+        MessageResponse(
             id=msg.id,
             content=msg.content,
             user_id=msg.user_id,
@@ -496,59 +581,32 @@ async def get_group_messages(
             is_ai_message=msg.is_ai_message,
             ai_model_used=msg.ai_model_used,
             created_at=msg.created_at.isoformat()
-        ))
-    
-    return result
+        )
+        for msg, sender_username in rows
+    ]
 
 
 @router.post("/{group_id}/messages", response_model=MessageResponse)
 async def send_message_to_group(
     group_id: int,
     request: SendMessageRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Send a message to a group"""
-    # Check if user is member of group
-    membership_stmt = select(GroupMember).where(
-        and_(
-            GroupMember.user_id == current_user.id,
-            GroupMember.group_id == group_id
-        )
-    )
-    membership_result = await db.execute(membership_stmt)
-    membership = membership_result.scalar_one_or_none()
+    message_service = MessageService(db)
     
-    if not membership:
+    # Check if user is member of group
+    if not await message_service.is_group_member(current_user.id, group_id):
         raise HTTPException(status_code=403, detail="Not a member of this group")
     
-    # Create message
-    new_message = Message(
-        content=request.content,
-        user_id=current_user.id,
-        group_id=group_id,
-        is_ai_message=False,
-        created_at=datetime.utcnow()
-    )
-    
-    db.add(new_message)
-    await db.commit()
-    await db.refresh(new_message)
+    # Batched with concurrent sends into one transaction; returns once committed
+    new_message = await message_ingest.submit(current_user.id, group_id, request.content)
 
     # Broadcast new message to group members via WebSocket
-    message_payload = {
-        "type": "new_message",
-        "message": {
-            "id": new_message.id,
-            "content": new_message.content,
-            "user_id": new_message.user_id,
-            "sender_username": current_user.username,
-            "user_email": current_user.email,
-            "group_id": new_message.group_id,
-            "is_ai_message": False,
-            "created_at": new_message.created_at.isoformat() if new_message.created_at else None,
-        }
-    }
+    message_payload = MessageService.build_new_message_event(
+        new_message, current_user.username, current_user.email
+    )
     await manager.send_to_group(group_id, message_payload, exclude_user=current_user.id)
 
     return MessageResponse(
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel
-from typing import Optional
-from app.core.database import get_db
+from typing import List, Optional
+from app.core.database import AsyncSessionLocal
+from app.core.read_routing import read_session_factory, recent_writers
 from app.services.ai_service import AIService
-from app.core.dependencies import get_current_user
-from app.models import User
+from app.core.dependencies import get_current_principal, get_read_db
+from app.models import GroupMember, Message
+from app.schemas.user import UserPrincipal
+from app.services.message_ingest import message_ingest
+from app.services.message_search import MessageSearchService
+from app.services.message_service import MessageService
 from app.services.websocket_manager import manager
 
 router = APIRouter()
@@ -31,34 +37,83 @@ class AIMessageResponse(BaseModel):
     user_credits_remaining: Optional[float] = None
 
 
+class MessageSearchResult(BaseModel):
+    id: int
+    group_id: int
+    content: str
+    highlight: str  # HTML-escaped content excerpt, matches wrapped in <mark>
+    user_id: Optional[int]
+    sender_username: Optional[str]
+    is_ai_message: bool
+    created_at: str
+    score: float
+
+
+@router.get("/search", response_model=List[MessageSearchResult])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    group_id: Optional[int] = None,
+    sort: str = Query("relevance", pattern="^(relevance|recent)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50),
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Full-text search over messages in the user's groups
+    
+    Every word of ``q`` must match; the last one also matches as a prefix.
+    ``sort=relevance`` ranks the most recent matches, ``sort=recent`` lists
+    all matches newest first. Pass the X-Next-Cursor header as ``cursor``
+    (with the same ``q``, ``group_id`` and ``sort``) for the next page.
+    """
+    if group_id is not None and not await MessageService(db).is_group_member(current_user.id, group_id):
+        raise HTTPException(status_code=403, detail="Not a member of this group")
+    
+    try:
+        hits, next_cursor = await MessageSearchService(db).search(
+            current_user.id, q, group_id=group_id, sort=sort, cursor=cursor, limit=limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return [
+        MessageSearchResult(
+            id=msg.id,
+            group_id=msg.group_id,
+            content=msg.content,
+            highlight=highlight,
+            user_id=msg.user_id,
+            sender_username=sender_username,
+            is_ai_message=msg.is_ai_message,
+            created_at=msg.created_at.isoformat(),
+            score=score
+        )
+        for msg, sender_username, score, highlight in hits
+    ]
+
+
 @router.get("/")
 async def get_messages(
     group_id: int = None,
     limit: int = 50,
     offset: int = 0,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get messages from groups user belongs to"""
-    from app.models import Message, ChatGroup, GroupMember
-    from sqlalchemy import and_, desc
-    
-    query = db.query(Message).join(ChatGroup).join(GroupMember)
-    
+    my_groups = select(GroupMember.group_id).where(GroupMember.user_id == current_user.id)
+    stmt = select(Message).where(Message.group_id.in_(my_groups))
     if group_id:
-        # Get messages from specific group if user is a member
-        query = query.filter(
-            and_(
-                Message.group_id == group_id,
-                GroupMember.user_id == current_user.id,
-                GroupMember.group_id == group_id
-            )
-        )
-    else:
-        # Get messages from all groups user belongs to
-        query = query.filter(GroupMember.user_id == current_user.id)
+        # Only from that group, and only if the user is a member
+        stmt = stmt.where(Message.group_id == group_id)
     
-    messages = query.order_by(desc(Message.created_at)).offset(offset).limit(limit).all()
+    result = await db.execute(
+        stmt.order_by(Message.created_at.desc(), Message.id.desc()).offset(offset).limit(limit)
+    )
+    messages = result.scalars().all()
     
     return {
         "messages": [
@@ -81,53 +136,24 @@ async def get_messages(
 @router.post("/send")
 async def send_message(
     request: SendMessageRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Send a message to a group"""
-    from app.models import Message, GroupMember
-    from datetime import datetime
-    from sqlalchemy import and_
-    
     # Check if user is member of the group
-    membership = db.query(GroupMember).filter(
-        and_(
-            GroupMember.user_id == current_user.id,
-            GroupMember.group_id == request.group_id
-        )
-    ).first()
-    
-    if not membership:
+    if not await MessageService(db).is_group_member(current_user.id, request.group_id):
         raise HTTPException(status_code=403, detail="Not a member of this group")
     
-    # Create message
-    new_message = Message(
-        content=request.content,
-        user_id=current_user.id,
-        group_id=request.group_id,
-        created_at=datetime.utcnow(),
-        is_ai_message=False
-    )
-    
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    # Batched with concurrent sends into one transaction; returns once committed
+    new_message = await message_ingest.submit(current_user.id, request.group_id, request.content)
+    await recent_writers.mark(current_user.id)
     
     # Broadcast message to all group members via WebSocket
-    print(f"About to broadcast to group {request.group_id}")
-    await manager.send_to_group(request.group_id, {
-        "type": "new_message",
-        "message": {
-            "id": new_message.id,
-            "content": new_message.content,
-            "user_id": new_message.user_id,
-            "user_email": current_user.email,
-            "group_id": new_message.group_id,
-            "created_at": new_message.created_at.isoformat(),
-            "is_ai_message": new_message.is_ai_message
-        }
-    }, exclude_user_id=current_user.id)  # Sửa từ exclude_user thành exclude_user_id
-    print(f"Broadcast completed for group {request.group_id}")
+    await manager.send_to_group(
+        request.group_id,
+        MessageService.build_new_message_event(new_message, current_user.username, current_user.email),
+        exclude_user=current_user.id
+    )
     
     return {
         "message": "Message sent successfully",
@@ -139,95 +165,47 @@ async def send_message(
 @router.post("/ai", response_model=AIMessageResponse)
 async def send_ai_message(
     request: AIMessageRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal)
 ):
-    """Send message to AI and deduct credits"""
-    from app.models import Message, GroupMember
-    from datetime import datetime
-    from sqlalchemy import and_
-    
-    ai_service = AIService(db)
-    
-    # Check if user is member of the group
-    membership = db.query(GroupMember).filter(
-        and_(
-            GroupMember.user_id == current_user.id,
-            GroupMember.group_id == request.group_id
-        )
-    ).first()
-    
-    if not membership:
-        raise HTTPException(status_code=403, detail="Not a member of this group")
+    """Send message to AI and deduct credits
+    
+    The membership check reads from a read session and both messages go
+    through the group-commit buffer. The credit deduction (and a refund if the
+    model fails) are short write transactions of their own, so no connection
+    is held while the model runs.
+    """
+    session_factory = await read_session_factory(current_user.id)
+    async with session_factory() as db:
+        if not await MessageService(db).is_group_member(current_user.id, request.group_id):
+            raise HTTPException(status_code=403, detail="Not a member of this group")
     
     # Save user's message first
-    user_message = Message(
-        content=request.message,
-        user_id=current_user.id,
-        group_id=request.group_id,
-        created_at=datetime.utcnow(),
-        is_ai_message=False
+    user_message = await message_ingest.submit(current_user.id, request.group_id, request.message)
+    # The balance and history are read back right after this
+    await recent_writers.mark(current_user.id)
+    await manager.send_to_group(
+        request.group_id,
+        MessageService.build_new_message_event(user_message, current_user.username, current_user.email),
+        exclude_user=current_user.id
     )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
     
-    # Broadcast user's message to group
-    await manager.send_to_group(request.group_id, {
-        "type": "new_message",
-        "message": {
-            "id": user_message.id,
-            "content": user_message.content,
-            "user_id": user_message.user_id,
-            "user_email": current_user.email,
-            "group_id": user_message.group_id,
-            "created_at": user_message.created_at.isoformat(),
-            "is_ai_message": user_message.is_ai_message
-        }
-    }, exclude_user=current_user.id)
-    
-    # Process AI request
-    result = await ai_service.process_ai_request(
-        user_id=current_user.id,
-        model=request.model,
-        message=request.message
-    )
+    async with AsyncSessionLocal() as db:
+        ai_service = AIService(db)
+        result = await ai_service.process_ai_request(
+            user_id=current_user.id,
+            model=request.model,
+            message=request.message
+        )
     
-    # If AI request succeeded, save AI response
+    # If AI request succeeded, save and broadcast the AI response
     if result.get("success"):
-        ai_message = Message(
-            content=result.get("response"),
-            user_id=None,  # AI messages have no user_id
-            group_id=request.group_id,
-            created_at=datetime.utcnow(),
-            is_ai_message=True,
-            ai_model_used=request.model
+        ai_message = await message_ingest.submit(
+            None, request.group_id, result.get("response"), ai_model=request.model
+        )
+        await manager.send_to_group(
+            request.group_id,
+            MessageService.build_new_message_event(ai_message, None, "AI Assistant")
         )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
-        
-        # Broadcast AI response to group
-        await manager.send_to_group(request.group_id, {
-            "type": "new_message",
-            "message": {
-                "id": ai_message.id,
-                "content": ai_message.content,
-                "user_id": ai_message.user_id,
-                "user_email": "AI Assistant",
-                "group_id": ai_message.group_id,
-                "created_at": ai_message.created_at.isoformat(),
-                "is_ai_message": ai_message.is_ai_message,
-                "ai_model_used": ai_message.ai_model_used
-            }
-        })
-    
-    else:
-        db.commit()
-    
-    # Get updated user credits
-    updated_user = await ai_service.user_service.get_user(current_user.id)
-    user_credits = updated_user.credits if updated_user else 0
     
     return AIMessageResponse(
         response=result.get("response"),
@@ -235,7 +213,7 @@ async def send_ai_message(
         credits_used=ai_service.get_ai_model_rate(request.model) if result.get("success") else 0,
         success=result.get("success", False),
         error=result.get("error"),
-        user_credits_remaining=user_credits
+        user_credits_remaining=result.get("user_credits")
     )
 
 
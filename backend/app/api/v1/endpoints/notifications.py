@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.core.database import get_db
-from app.core.dependencies import get_current_user
-from app.models import User
+from app.core.dependencies import get_current_principal, get_read_db
+from app.schemas.user import UserPrincipal
 from app.schemas.notification import NotificationResponse, NotificationSummary, NotificationUpdate
 from app.services.notification_service import NotificationService
 
@@ -15,8 +15,8 @@ async def get_notifications(
     limit: int = 20,
     offset: int = 0,
     unread_only: bool = False,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get user notifications"""
     notification_service = NotificationService(db)
@@ -66,7 +66,7 @@ async def get_notifications(
 @router.put("/{notification_id}/read")
 async def mark_notification_read(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Mark a notification as read"""
@@ -85,7 +85,7 @@ async def mark_notification_read(
 
 @router.put("/read-all")
 async def mark_all_notifications_read(
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Mark all notifications as read"""
@@ -98,8 +98,8 @@ async def mark_all_notifications_read(
 
 @router.get("/count")
 async def get_notification_count(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get notification counts"""
     notification_service = NotificationService(db)
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func, and_
 from pydantic import BaseModel
 from typing import Optional
 from app.core.database import get_db
-from app.core.dependencies import get_current_user
+from app.core.dependencies import get_current_user, get_current_principal, get_read_db
+from app.services.user_search import UserSearchService
 from app.services.user_service import UserService
 from app.models import User
+from app.schemas.user import UserPrincipal
 
 router = APIRouter()
 
@@ -51,27 +52,17 @@ async def get_current_user_info(
 
 @router.get("/search")
 async def search_users(
-    query: str,
-    limit: int = 10,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    query: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Search users by email or username"""
-    
-    stmt = select(User).where(
-        and_(
-            or_(
-                func.lower(User.email).contains(query.lower()),
-                func.lower(User.username).contains(query.lower()),
-                func.lower(User.full_name).contains(query.lower())
-            ),
-            User.id != current_user.id,  # Exclude current user
-            User.is_active == True
-        )
-    ).limit(limit)
+    """Search users by username, name or email, for autocomplete
     
-    result = await db.execute(stmt)
-    users = result.scalars().all()
+    Exact usernames and prefix matches come first, then people who share
+    more groups with the current user.
+    """
+    results = await UserSearchService(db).search(current_user.id, query, limit)
     
     return {
         "users": [
@@ -79,8 +70,9 @@ async def search_users(
                 "id": user.id,
                 "email": user.email,
                 "username": user.username,
-                "full_name": user.full_name
-            } for user in users
+                "full_name": user.full_name,
+                "shared_groups": shared_groups
+            } for user, shared_groups in results
         ]
     }
 
@@ -88,11 +80,14 @@ async def search_users(
 @router.put("/me", response_model=UserResponse)
 async def update_current_user_profile(
     request: UpdateProfileRequest,
-    current_user: User = Depends(get_current_user),
+    principal: UserPrincipal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Update current user's profile"""
     user_service = UserService(db)
+    current_user = await user_service.get_user_by_id(principal.id)
+    if current_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
     # Check if email or username already exists (if being changed)
     if request.email and request.email != current_user.email:
@@ -106,15 +101,12 @@ async def update_current_user_profile(
             raise HTTPException(status_code=400, detail="Username already taken")
     
     # Update fields
-    if request.username:
-        current_user.username = request.username
-    if request.full_name is not None:  # Allow empty string
-        current_user.full_name = request.full_name
-    if request.email:
-        current_user.email = request.email
-    
-    await db.commit()
-    await db.refresh(current_user)
+    current_user = await user_service.update_profile(
+        current_user,
+        username=request.username,
+        full_name=request.full_name,
+        email=request.email
+    )
     
     return UserResponse(
         id=current_user.id,
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import logging
+
+from app.services.websocket_manager import manager
+
+
+# Served by app.main, or by app.gateway when WebSockets run in their own process
+router = APIRouter()
+
+
+@router.websocket("/ws/{token}")
+async def websocket_endpoint(websocket: WebSocket, token: str):
+    """WebSocket endpoint for real-time chat"""
+    context = await manager.connect(websocket, token)
+    if context is None:
+        return
+
+    try:
+        await manager.listen_for_messages(context)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logging.error(f"WebSocket error: {e}")
+    finally:
+        await manager.disconnect(context)
+
+
+@router.get("/health/websocket")
+async def websocket_stats():
+    """WebSocket connection counts for this worker"""
+    return manager.get_stats()
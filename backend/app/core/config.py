@@ -7,11 +7,67 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./groupchatai.db"
     REDIS_URL: str = "redis://redis:6379"  # Use Docker service name by default
+    # SQLite only: WAL, tuned pragmas, pooled read-only connections and one writer connection
+    SQLITE_PERFORMANCE_MODE: bool = False
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    SQLITE_MMAP_SIZE_BYTES: int = 256 * 1024 * 1024
+    DB_READ_POOL_SIZE: int = 8
+    # Group commit for chat messages: concurrent sends within this window share
+    # one transaction (0 writes each message on its own)
+    MESSAGE_INGEST_WINDOW_MS: int = 5
+    MESSAGE_INGEST_MAX_BATCH: int = 500
+    # Cold tier: scripts/archive_messages.py moves older messages into segment files here
+    MESSAGE_ARCHIVE_DIR: str = "./message_archive"
+    MESSAGE_ARCHIVE_AFTER_DAYS: int = 180
+    MESSAGE_ARCHIVE_SEGMENT_ROWS: int = 10000
+    MESSAGE_ARCHIVE_DELETE_BATCH: int = 500
+    # Relevance search ranks at most this many of the newest matches
+    MESSAGE_SEARCH_MAX_CANDIDATES: int = 5000
+    # User search: matches considered per query before ranking, and how often
+    # the in-memory index used on SQLite picks up changed users
+    USER_SEARCH_CANDIDATES: int = 200
+    USER_SEARCH_REFRESH_SECONDS: float = 5.0
+    # Optional Postgres streaming replica for read-only endpoints
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # After a user writes, their reads stay on the primary this long
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    
+    # Real-time fan-out: "memory" for a single process, "redis" for multiple workers
+    BROADCAST_BACKEND: str = "memory"
+    # Negotiate permessage-deflate with clients that offer it
+    WS_PER_MESSAGE_DEFLATE: bool = True
+    # Frames buffered per socket before it is dropped as a slow consumer
+    WS_SEND_QUEUE_SIZE: int = 256
+    # Protocol-level pings sent by uvicorn; browsers answer them without any client
+    # code, and a socket whose pong does not arrive within the timeout is closed
+    WS_PING_INTERVAL_SECONDS: float = 20.0
+    WS_PING_TIMEOUT_SECONDS: float = 20.0
+    # Opt-in reaping for clients that answer {"type": "ping"} frames: sockets that
+    # send nothing for this long are closed (0 disables it)
+    WS_IDLE_TIMEOUT_SECONDS: int = 0
+    # True when /ws is served by the standalone gateway (app.gateway:app) instead of the API;
+    # the API then needs the redis broadcast and presence backends
+    WEBSOCKET_GATEWAY: bool = False
+    # Recent sequenced events kept per group for reconnect replay
+    REPLAY_BUFFER_SIZE: int = 500
+    # Typing indicators are coalesced and flushed once per tick
+    TYPING_TICK_MS: int = 300
+    TYPING_TTL_SECONDS: float = 6.0
+    # Presence: "memory" for a single process, "redis" for multiple workers
+    PRESENCE_BACKEND: str = "memory"
+    PRESENCE_TTL_SECONDS: int = 60
+    PRESENCE_SWEEP_SECONDS: int = 20
     
     # Authentication
     JWT_SECRET: str = "your-super-secret-jwt-key-change-this-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 24 * 7  # 7 days
+    # Authenticated-user principals cached per worker to skip a query per request
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    # Per-worker cache of notification badge counts
+    NOTIFICATION_COUNT_CACHE_SECONDS: int = 10
     
     # Google OAuth
     GOOGLE_CLIENT_ID: Optional[str] = None
@@ -1,16 +1,114 @@
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 
-# Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.SQLALCHEMY_ECHO,  # Use specific setting instead of DEBUG
-    pool_pre_ping=True,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+def _sqlite_performance_mode() -> bool:
+    return settings.SQLITE_PERFORMANCE_MODE and settings.DATABASE_URL.startswith("sqlite")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, read_only: bool):
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # WAL lets readers run alongside the writer; the setting persists in the file
+        cursor.execute("PRAGMA journal_mode=WAL")
+    # NORMAL only syncs at checkpoints, which is safe in WAL mode
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_BYTES}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+# Statements that never need the write lock; anything else (DML, DDL,
+# SAVEPOINT) starts the write transaction first
+_READ_STATEMENTS = ("SELECT", "WITH", "PRAGMA", "EXPLAIN")
+
+
+def _is_write(statement: str, context) -> bool:
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        return True
+    return not statement.lstrip().upper().startswith(_READ_STATEMENTS)
+
+
+if _sqlite_performance_mode():
+    sqlite_connect_args = {
+        "check_same_thread": False,
+        "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+    }
+
+    # SQLite admits one writer at a time, so each process keeps exactly one
+    # write connection and sessions queue for it instead of failing with
+    # "database is locked"
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.SQLALCHEMY_ECHO,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        connect_args=sqlite_connect_args
+    )
+    read_engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.SQLALCHEMY_ECHO,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=0,
+        connect_args=sqlite_connect_args
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_write_connect(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, read_only=False)
+        # Let SQLAlchemy issue BEGIN itself (see _on_write_execute)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _on_write_begin(conn):
+        conn.info["sqlite_write_begun"] = False
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _on_write_execute(conn, cursor, statement, parameters, context, executemany):
+        # Take the write lock right before the transaction's first write, not
+        # at BEGIN: reads before it run in autocommit and never block other
+        # processes' writers. Starting with BEGIN IMMEDIATE (rather than
+        # upgrading a deferred read transaction) means a concurrent writer
+        # makes this one wait for busy_timeout instead of failing outright.
+        if conn.info.get("sqlite_write_begun", True) or not _is_write(statement, context):
+            return
+        conn.info["sqlite_write_begun"] = True
+        cursor.execute("BEGIN IMMEDIATE")
+
+    @event.listens_for(read_engine.sync_engine, "connect")
+    def _on_read_connect(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, read_only=True)
+else:
+    # Create async engine
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.SQLALCHEMY_ECHO,  # Use specific setting instead of DEBUG
+        pool_pre_ping=True,
+        connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    )
+    if settings.DATABASE_REPLICA_URL:
+        # Replica for read-only endpoints; see app.core.read_routing for read-your-writes
+        read_engine = create_async_engine(
+            settings.DATABASE_REPLICA_URL,
+            echo=settings.SQLALCHEMY_ECHO,
+            pool_pre_ping=True
+        )
+    else:
+        # Reads share the main engine unless a read-only pool is configured
+        read_engine = engine
+
+# True when reads may lag behind writes (a streaming replica, not the SQLite read pool)
+replica_enabled = bool(settings.DATABASE_REPLICA_URL) and not _sqlite_performance_mode()
 
 # Create session factory
 AsyncSessionLocal = sessionmaker(
@@ -19,6 +117,13 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Sessions for read-only work
+AsyncReadSessionLocal = sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -32,7 +137,27 @@ async def get_db():
             await session.close()
 
 
+async def get_read_only_db():
+    """Dependency to get a read-only session for endpoints without a signed-in user
+
+    Signed-in endpoints use app.core.dependencies.get_read_db, which also
+    keeps a user's reads on the primary right after they wrote.
+    """
+    async with AsyncReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def dispose_engines():
+    """Close pooled connections on shutdown"""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
 # Redis connection
 import redis.asyncio as redis
 
-redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
\ No newline at end of file
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -1,45 +1,102 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import AsyncReadSessionLocal, AsyncSessionLocal, replica_enabled
+from app.core.read_routing import read_session_factory
 from app.core.security import verify_token
-from app.services.user_service import UserService
+from app.schemas.user import UserPrincipal
+from app.services.user_service import UserService, principal_cache
 from app.models import User
 
 
 security = HTTPBearer()
 
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
 
-async def get_current_user(
-    token: str = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+
+def get_token_user_id(token) -> int:
+    """Decode the bearer token and return its user id"""
     try:
         # Extract token from HTTPAuthorizationCredentials
         token_str = token.credentials if hasattr(token, 'credentials') else str(token)
         payload = verify_token(token_str)
-        
+
         user_id_str = payload.get("sub")
         if user_id_str is None:
             raise credentials_exception
-        
+
         # Convert string user_id to integer for database query
-        user_id: int = int(user_id_str)
-            
+        return int(user_id_str)
+
     except Exception:
         raise credentials_exception
-    
-    user_service = UserService(db)
-    user = await user_service.get_user_by_id(user_id)
-    
+
+
+async def get_current_user(request: Request, token: str = Depends(security)) -> User:
+    """Get current authenticated user from JWT token
+
+    Loads the full row through a read session (see get_read_db) and returns
+    it detached, so endpoints that only show the user never hold the write
+    connection. Endpoints that change the user load it again in their own
+    session; when the id and flags are enough prefer get_current_principal.
+    """
+    user_id = get_token_user_id(token)
+    # Lets ReadYourWritesMiddleware pin this user's reads to the primary after a write
+    request.state.user_id = user_id
+
+    session_factory = await read_session_factory(user_id)
+    async with session_factory() as db:
+        user = await UserService(db).get_user_by_id(user_id)
+
+    if user is None and replica_enabled:
+        # A user who just registered may not have reached the replica yet
+        async with AsyncSessionLocal() as db:
+            user = await UserService(db).get_user_by_id(user_id)
+
     if user is None:
         raise credentials_exception
-        
-    return user
\ No newline at end of file
+
+    return user
+
+
+async def get_current_principal(request: Request, token: str = Depends(security)) -> UserPrincipal:
+    """Get the authenticated user's id and flags, usually without touching the database
+
+    Principals are cached per worker for AUTH_CACHE_TTL_SECONDS and invalidated
+    by UserService whenever it changes the user. A session is only opened on a
+    cache miss.
+    """
+    user_id = get_token_user_id(token)
+    request.state.user_id = user_id
+
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        async with AsyncReadSessionLocal() as db:
+            principal = await UserService(db).get_principal(user_id)
+
+    if principal is None and replica_enabled:
+        # A user who just registered may not have reached the replica yet
+        async with AsyncSessionLocal() as db:
+            principal = await UserService(db).get_principal(user_id)
+
+    if principal is None:
+        raise credentials_exception
+
+    return principal
+
+
+async def get_read_db(current_user: UserPrincipal = Depends(get_current_principal)):
+    """Dependency to get a session for endpoints that only read
+
+    Uses the replica when one is configured, except right after this user
+    wrote something (see app.core.read_routing).
+    """
+    session_factory = await read_session_factory(current_user.id)
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,92 @@
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from alembic import command
+from pathlib import Path
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+# Tables of the schema Base.metadata.create_all used to build, which 0001 recreates
+BASELINE_REVISION = "0001"
+BASELINE_TABLES = {
+    "users", "chat_groups", "group_members", "messages",
+    "group_invitations", "notifications", "credit_transactions",
+}
+
+
+def get_alembic_config() -> Config:
+    return Config(str(ALEMBIC_INI))
+
+
+def get_head_revision() -> Optional[str]:
+    return ScriptDirectory.from_config(get_alembic_config()).get_current_head()
+
+
+async def get_current_revision(engine: AsyncEngine) -> Optional[str]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision())
+
+
+async def check_schema_revision(engine: AsyncEngine):
+    """Refuse to start against a database that is not at the latest migration
+
+    Schema changes are applied once per deploy with ``alembic upgrade head``,
+    not by every worker at boot.
+    """
+    current, head = await get_current_revision(engine), get_head_revision()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current or 'none'}, expected {head}. "
+            f"Run 'alembic upgrade head' from the backend directory."
+        )
+    logger.info(f"Database schema is at revision {head}")
+
+
+async def upgrade_to_head(engine: AsyncEngine):
+    """Apply pending migrations on an existing engine (tools and benchmarks)"""
+    def upgrade(sync_conn):
+        config = get_alembic_config()
+        config.attributes["connection"] = sync_conn
+        config.attributes["configure_logger"] = False
+        command.upgrade(config, "head")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+
+
+async def stamp_unversioned_baseline(engine: AsyncEngine) -> bool:
+    """Mark a database built by create_all as the baseline revision
+
+    Such databases have the baseline tables but no alembic_version, so
+    ``alembic upgrade head`` would try to create the tables again. Returns
+    True when the database was stamped; fresh and already versioned
+    databases are left alone. Raises RuntimeError for an unversioned
+    database with only some of the baseline tables.
+    """
+    def stamp(sync_conn) -> bool:
+        if MigrationContext.configure(sync_conn).get_current_revision() is not None:
+            return False
+        existing = BASELINE_TABLES & set(inspect(sync_conn).get_table_names())
+        if not existing:
+            return False
+        if existing != BASELINE_TABLES:
+            raise RuntimeError(
+                f"Database has no migration revision and only some baseline tables "
+                f"({', '.join(sorted(existing))}); refusing to stamp it"
+            )
+        config = get_alembic_config()
+        config.attributes["connection"] = sync_conn
+        config.attributes["configure_logger"] = False
+        command.stamp(config, BASELINE_REVISION)
+        return True
+
+    async with engine.begin() as conn:
+        stamped = await conn.run_sync(stamp)
+    if stamped:
+        logger.info(f"Stamped unversioned database as revision {BASELINE_REVISION}")
+    return stamped
@@ -0,0 +1,95 @@
+"""Read-replica routing with read-your-writes protection
+
+With DATABASE_REPLICA_URL set, read-only endpoints use the replica. A user who
+just changed something (any non-GET request) is kept on the primary for
+READ_YOUR_WRITES_SECONDS, so replication lag never hides their own writes from
+them. The marker is per worker, plus Redis when BROADCAST_BACKEND=redis so
+every worker sees it.
+"""
+import logging
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncReadSessionLocal, AsyncSessionLocal, replica_enabled
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class RecentWriters:
+    """Users who wrote within the read-your-writes window"""
+
+    KEY_PREFIX = "recent_write:"
+
+    def __init__(self, window_seconds: float, redis_client=None):
+        self.window_seconds = window_seconds
+        self.redis = redis_client
+        self._local = TTLCache(window_seconds, settings.AUTH_CACHE_MAX_ENTRIES)
+
+    async def mark(self, user_id: int):
+        self._local.set(user_id, True)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(f"{self.KEY_PREFIX}{user_id}", 1, px=int(self.window_seconds * 1000))
+        except Exception as e:
+            logger.warning(f"Could not record recent write for user {user_id}: {e}")
+
+    async def wrote_recently(self, user_id: int) -> bool:
+        if self._local.get(user_id):
+            return True
+        if self.redis is None:
+            return False
+        try:
+            return bool(await self.redis.exists(f"{self.KEY_PREFIX}{user_id}"))
+        except Exception as e:
+            # Without the marker the primary is the only safe answer
+            logger.warning(f"Could not check recent writes for user {user_id}: {e}")
+            return True
+
+
+def _create_recent_writers() -> RecentWriters:
+    if settings.BROADCAST_BACKEND.lower() == "redis":
+        from app.core.database import redis_client
+        return RecentWriters(settings.READ_YOUR_WRITES_SECONDS, redis_client)
+    return RecentWriters(settings.READ_YOUR_WRITES_SECONDS)
+
+
+recent_writers = _create_recent_writers()
+
+
+async def read_session_factory(user_id: Optional[int]):
+    """Session factory for a read on behalf of user_id"""
+    if not replica_enabled:
+        return AsyncReadSessionLocal
+    if user_id is not None and await recent_writers.wrote_recently(user_id):
+        return AsyncSessionLocal
+    return AsyncReadSessionLocal
+
+
+class ReadYourWritesMiddleware:
+    """Marks the caller as a recent writer when a non-GET request responds
+
+    The user id comes from request.state.user_id, which the auth dependencies
+    set. The marker is written before the response starts, so the client cannot
+    issue a follow-up read that races it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                user_id = scope.get("state", {}).get("user_id")
+                if user_id is not None:
+                    await recent_writers.mark(user_id)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,39 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, binary WebSocket frames are then unavailable
+    msgpack = None
+
+
+def dumps(obj) -> str:
+    """Serialize to a compact JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+def loads(data):
+    """Parse JSON text or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def msgpack_dumps(obj) -> bytes:
+    """Serialize to MessagePack"""
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def msgpack_loads(data: bytes):
+    """Parse MessagePack; map keys may be ints (e.g. group ids)"""
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
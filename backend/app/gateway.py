@@ -0,0 +1,71 @@
+"""Standalone WebSocket gateway
+
+Runs only the ConnectionManager, so socket heartbeats and fan-out are not
+stalled by CPU-heavy REST requests and both tiers can be scaled separately:
+
+    uvicorn app.gateway:app --port 8001 --ws-per-message-deflate true
+
+The REST API runs with WEBSOCKET_GATEWAY=true and publishes group events
+through the Redis broadcast backend, which the gateway subscribes to.
+"""
+from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import logging
+
+from app.core.config import settings
+from app.core.database import engine, dispose_engines
+from app.core.migrations import check_schema_revision
+from app.api.websocket import router as websocket_router
+from app.services.message_ingest import message_ingest
+from app.services.websocket_manager import manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    logging.info("Starting up GroupChatAI WebSocket gateway...")
+
+    if settings.BROADCAST_BACKEND.lower() != "redis":
+        logging.warning("Gateway is using the in-memory broadcast backend; it will not see events from the API")
+
+    await check_schema_revision(engine)
+    await manager.start()
+    await message_ingest.start()
+
+    yield
+
+    # Shutdown
+    logging.info("Shutting down GroupChatAI WebSocket gateway...")
+    # Commit messages still waiting in the ingest buffer before anything closes
+    await message_ingest.stop()
+    await manager.stop()
+    await dispose_engines()
+
+
+app = FastAPI(
+    title="GroupChatAI WebSocket Gateway",
+    version="1.0.0",
+    lifespan=lifespan,
+    docs_url=None,
+    redoc_url=None
+)
+
+app.include_router(websocket_router)
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "healthy", "service": "GroupChatAI WebSocket Gateway"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "app.gateway:app",
+        host="0.0.0.0",
+        port=8001,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT_SECONDS
+    )
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
@@ -8,8 +8,13 @@ import logging
 from pydantic import ValidationError
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, dispose_engines, replica_enabled
+from app.core.read_routing import ReadYourWritesMiddleware
+from app.core.migrations import check_schema_revision
 from app.api.v1.api import api_router
+from app.api.websocket import router as websocket_router
+from app.services.message_ingest import message_ingest
+from app.services.user_search import user_search_index
 from app.services.websocket_manager import manager
 
 
@@ -18,16 +23,29 @@ async def lifespan(app: FastAPI):
     # Startup
     logging.info("Starting up GroupChatAI application...")
     
-    # Create database tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if settings.WEBSOCKET_GATEWAY and settings.BROADCAST_BACKEND.lower() != "redis":
+        raise RuntimeError("WEBSOCKET_GATEWAY requires BROADCAST_BACKEND=redis to reach the gateway")
+    if settings.WEBSOCKET_GATEWAY and settings.PRESENCE_BACKEND.lower() != "redis":
+        raise RuntimeError("WEBSOCKET_GATEWAY requires PRESENCE_BACKEND=redis to read presence tracked by the gateway")
     
-    logging.info("Database tables created successfully")
+    # Migrations run as a deploy step; refuse to serve an out-of-date schema
+    await check_schema_revision(engine)
+    
+    # With a separate gateway this process only publishes group events
+    await manager.start(serve_sockets=not settings.WEBSOCKET_GATEWAY)
+    await message_ingest.start()
+    # SQLite only: builds the in-memory user search index in the background
+    await user_search_index.start()
     
     yield
     
     # Shutdown
     logging.info("Shutting down GroupChatAI application...")
+    # Commit messages still waiting in the ingest buffer before anything closes
+    await message_ingest.stop()
+    await user_search_index.stop()
+    await manager.stop()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -46,8 +64,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursors for list endpoints
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Keep a user's reads on the primary right after they write
+if replica_enabled:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 # Add trusted host middleware
 app.add_middleware(
     TrustedHostMiddleware,
@@ -89,17 +113,9 @@ async def pydantic_validation_exception_handler(request: Request, exc: Validatio
 app.include_router(api_router, prefix="/api/v1")
 
 
-@app.websocket("/ws/{token}")
-async def websocket_endpoint(websocket: WebSocket, token: str):
-    """WebSocket endpoint for real-time chat"""
-    try:
-        await manager.connect(websocket, token)
-        await manager.listen_for_messages(websocket, token)
-    except WebSocketDisconnect:
-        await manager.disconnect(websocket, token)
-    except Exception as e:
-        logging.error(f"WebSocket error: {e}")
-        await manager.disconnect(websocket, token)
+# WebSockets are served here unless the standalone gateway (app.gateway) handles them
+if not settings.WEBSOCKET_GATEWAY:
+    app.include_router(websocket_router)
 
 
 @app.get("/")
@@ -124,5 +140,8 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=True,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT_SECONDS
     )
\ No newline at end of file
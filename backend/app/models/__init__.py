@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -6,6 +6,10 @@ from app.core.database import Base
 
 class GroupMember(Base):
     __tablename__ = "group_members"
+    # The primary key leads with user_id, so lookups by group need their own index
+    __table_args__ = (
+        Index("ix_group_members_group_id", "group_id"),
+    )
     
     user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
     group_id = Column(Integer, ForeignKey('chat_groups.id'), primary_key=True)
@@ -19,6 +23,10 @@ class GroupMember(Base):
 
 class User(Base):
     __tablename__ = "users"
+    # Lets the in-memory user search index (SQLite) fetch only changed users
+    __table_args__ = (
+        Index("ix_users_updated_at", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -38,6 +46,10 @@ class User(Base):
     # Credit system
     credits = Column(Float, default=100.0)
     
+    # Maintained by NotificationService; scripts/reconcile_notification_counts.py repairs drift
+    notification_count = Column(Integer, nullable=False, default=0, server_default="0")
+    unread_notification_count = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Timestamps
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -63,6 +75,8 @@ class ChatGroup(Base):
     is_private = Column(Boolean, default=False)
     invite_code = Column(String(50), unique=True, nullable=True)
     max_members = Column(Integer, default=100)
+    # Denormalized; kept in step with group_members by GroupService
+    member_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     # AI settings
     ai_enabled = Column(Boolean, default=False)
@@ -84,6 +98,9 @@ class ChatGroup(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_group_created_id", "group_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
@@ -137,6 +154,9 @@ class GroupInvitation(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String(50), nullable=False)  # group_invitation, group_message, system, etc.
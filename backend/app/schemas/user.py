@@ -65,6 +65,20 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserPrincipal(BaseModel):
+    """Identity and flags of the authenticated user, cached between requests"""
+    id: int
+    email: str
+    username: str
+    full_name: Optional[str] = None
+    is_active: Optional[bool] = True
+    is_verified: Optional[bool] = False
+    
+    class Config:
+        from_attributes = True
+        frozen = True
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,60 @@
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Annotated, Dict, Literal, Optional, Union
+
+
+class JoinGroupFrame(BaseModel):
+    type: Literal["join_group"]
+    group_id: int
+
+
+class LeaveGroupFrame(BaseModel):
+    type: Literal["leave_group"]
+    group_id: int
+
+
+class TypingFrame(BaseModel):
+    type: Literal["typing"]
+    group_id: int
+
+
+class StopTypingFrame(BaseModel):
+    type: Literal["stop_typing"]
+    group_id: int
+
+
+class HeartbeatFrame(BaseModel):
+    type: Literal["heartbeat"]
+
+
+class PongFrame(BaseModel):
+    type: Literal["pong"]
+
+
+class SendMessageFrame(BaseModel):
+    type: Literal["send_message"]
+    group_id: int
+    content: str = Field(min_length=1)
+    client_id: Optional[Union[str, int]] = None
+
+
+class ResumeFrame(BaseModel):
+    type: Literal["resume"]
+    groups: Dict[int, int]  # group_id -> last seen seq
+
+
+InboundFrame = Annotated[
+    Union[
+        JoinGroupFrame,
+        LeaveGroupFrame,
+        TypingFrame,
+        StopTypingFrame,
+        HeartbeatFrame,
+        PongFrame,
+        SendMessageFrame,
+        ResumeFrame,
+    ],
+    Field(discriminator="type")
+]
+
+# Built once at import; validates every inbound WebSocket frame
+inbound_frame_adapter = TypeAdapter(InboundFrame)
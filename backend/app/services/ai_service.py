@@ -26,32 +26,35 @@ class AIService:
     
     async def can_afford_ai_request(self, user_id: int, model: str) -> bool:
         """Check if user has enough credits for AI request"""
-        user = await self.user_service.get_user(user_id)
+        user = await self.user_service.get_user_by_id(user_id)
         if not user:
             return False
         
         required_credits = self.get_ai_model_rate(model)
         return user.credits >= required_credits
     
-    async def deduct_ai_credits(self, user_id: int, model: str) -> bool:
-        """Deduct credits for AI model usage"""
+    async def deduct_ai_credits(self, user_id: int, model: str) -> Optional[float]:
+        """Deduct credits for AI model usage; returns the new balance, or None if the user cannot afford it"""
         required_credits = self.get_ai_model_rate(model)
-        return await self.user_service.deduct_credits(user_id, required_credits)
+        return await self.user_service.deduct_credits(
+            user_id,
+            required_credits,
+            description=f"AI request using {model}",
+            ai_model=model
+        )
     
     async def process_ai_request(self, user_id: int, model: str, message: str) -> Optional[dict]:
         """Process AI request with credit deduction"""
-        # Check if user can afford the request
-        if not await self.can_afford_ai_request(user_id, model):
+        # The deduction itself checks the balance; a separate check first would race with it
+        balance = await self.deduct_ai_credits(user_id, model)
+        if balance is None:
+            user = await self.user_service.get_user_by_id(user_id)
             return {
                 "error": "Insufficient credits",
                 "required_credits": self.get_ai_model_rate(model),
-                "user_credits": (await self.user_service.get_user(user_id)).credits if await self.user_service.get_user(user_id) else 0
+                "user_credits": user.credits if user else 0
             }
         
-        # Deduct credits first
-        if not await self.deduct_ai_credits(user_id, model):
-            return {"error": "Failed to deduct credits"}
-        
         # Process AI request (placeholder for actual AI integration)
         try:
             # This is where you would integrate with OpenAI, Gemini etc.
@@ -61,12 +64,21 @@ class AIService:
                 "response": ai_response,
                 "model": model,
                 "credits_used": self.get_ai_model_rate(model),
+                "user_credits": balance,
                 "success": True
             }
         except Exception as e:
             # Refund credits on AI error
-            await self.user_service.update_user_credits(user_id, self.get_ai_model_rate(model))
-            return {"error": f"AI request failed: {str(e)}"}
+            user = await self.user_service.update_user_credits(
+                user_id,
+                self.get_ai_model_rate(model),
+                transaction_type="refund",
+                description=f"Refund for failed AI request using {model}"
+            )
+            return {
+                "error": f"AI request failed: {str(e)}",
+                "user_credits": user.credits if user else None
+            }
     
     async def _call_ai_model(self, model: str, message: str) -> str:
         """Call the actual AI model"""
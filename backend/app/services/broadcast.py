@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Handler invoked on every worker to deliver a pre-encoded group frame to its local sockets
+GroupEventHandler = Callable[[int, str, Optional[int]], Awaitable[None]]
+# Handler invoked on every worker with {user_id: encoded frame} for users it may hold sockets for
+UserEventHandler = Callable[[Dict[int, str]], Awaitable[None]]
+
+# Buffered event: (seq, exclude_user, frame)
+ReplayEvent = Tuple[int, Optional[int], str]
+
+
+class BroadcastBackend:
+    """Base class for fanning group events out to every worker"""
+
+    def __init__(self):
+        self._handler: Optional[GroupEventHandler] = None
+        self._user_handler: Optional[UserEventHandler] = None
+
+    def set_handler(self, handler: GroupEventHandler):
+        """Register the local delivery callback"""
+        self._handler = handler
+
+    def set_user_handler(self, handler: UserEventHandler):
+        """Register the local delivery callback for user-addressed frames"""
+        self._user_handler = handler
+
+    async def start(self):
+        """Start background resources (listeners, connections)"""
+
+    async def stop(self):
+        """Release background resources"""
+
+    async def subscribe(self, group_id: int):
+        """Start receiving events for a group on this worker"""
+
+    async def unsubscribe(self, group_id: int):
+        """Stop receiving events for a group on this worker"""
+
+    async def subscribe_users(self):
+        """Start receiving user-addressed events on this worker"""
+
+    async def publish_to_users(self, frames: Dict[int, str]):
+        """Publish one encoded frame per user to every worker"""
+        raise NotImplementedError
+
+    async def publish(self, group_id: int, frame: str, exclude_user: int = None, seq: int = None):
+        """Publish an encoded group frame to every worker
+
+        Frames with a sequence number are also kept in the group's replay buffer.
+        """
+        raise NotImplementedError
+
+    async def next_sequence(self, group_id: int) -> int:
+        """Allocate the next event sequence number for a group"""
+        raise NotImplementedError
+
+    async def replay(self, group_id: int, after_seq: int) -> Tuple[int, Optional[List[ReplayEvent]]]:
+        """Return the group's latest sequence and the buffered events after after_seq
+
+        The event list is None when events after after_seq are no longer buffered.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _events_after(latest: int, events: List[ReplayEvent], after_seq: int) -> Optional[List[ReplayEvent]]:
+        if after_seq >= latest:
+            return [] if after_seq == latest else None
+        # Concurrent publishers may append slightly out of order
+        events = sorted(events, key=lambda event: event[0])
+        if not events or events[0][0] > after_seq + 1:
+            return None
+        return [event for event in events if event[0] > after_seq]
+
+    async def _deliver_locally(self, group_id: int, frame: str, exclude_user: int = None):
+        if self._handler is not None:
+            await self._handler(group_id, frame, exclude_user)
+
+    async def _deliver_to_users_locally(self, frames: Dict[int, str]):
+        if self._user_handler is not None:
+            await self._user_handler(frames)
+
+
+class MemoryBroadcastBackend(BroadcastBackend):
+    """Single-process backend: events are delivered straight to local sockets"""
+
+    def __init__(self):
+        super().__init__()
+        self._sequences: Dict[int, int] = {}
+        self._events: Dict[int, Deque[ReplayEvent]] = {}
+
+    async def publish(self, group_id: int, frame: str, exclude_user: int = None, seq: int = None):
+        if seq is not None:
+            if group_id not in self._events:
+                self._events[group_id] = deque(maxlen=settings.REPLAY_BUFFER_SIZE)
+            self._events[group_id].append((seq, exclude_user, frame))
+        await self._deliver_locally(group_id, frame, exclude_user)
+
+    async def publish_to_users(self, frames: Dict[int, str]):
+        await self._deliver_to_users_locally(frames)
+
+    async def next_sequence(self, group_id: int) -> int:
+        self._sequences[group_id] = self._sequences.get(group_id, 0) + 1
+        return self._sequences[group_id]
+
+    async def replay(self, group_id: int, after_seq: int) -> Tuple[int, Optional[List[ReplayEvent]]]:
+        latest = self._sequences.get(group_id, 0)
+        return latest, self._events_after(latest, list(self._events.get(group_id, ())), after_seq)
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """Redis pub/sub backend with one channel per group
+
+    Events travel as "origin|group_id|exclude_user|frame" so receiving workers
+    forward the already-encoded frame without parsing it again. Sequence
+    numbers come from a per-group counter and the replay buffer is a capped
+    per-group list of "seq|exclude_user|frame" entries.
+
+    User-addressed frames share one channel as "origin" followed by one
+    "user_id|frame" line per user; compact JSON never contains a raw newline.
+    """
+
+    CHANNEL_PREFIX = "groupchat:group:"
+    USERS_CHANNEL = "groupchat:users"
+    # Users per message on USERS_CHANNEL, to keep single publishes small
+    USERS_BATCH_SIZE = 500
+    SEQUENCE_KEY = "groupchat:group:{}:seq"
+    EVENTS_KEY = "groupchat:group:{}:events"
+    # Drop replay buffers of groups that went quiet
+    EVENTS_TTL_SECONDS = 24 * 3600
+
+    def __init__(self, redis_client=None):
+        super().__init__()
+        if redis_client is None:
+            from app.core.database import redis_client
+        self.redis = redis_client
+        # Identifies events this worker published so they are not delivered twice
+        self.origin = uuid.uuid4().hex
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._channels: Set[str] = set()
+        self._has_channels = asyncio.Event()
+
+    def channel_for(self, group_id: int) -> str:
+        return f"{self.CHANNEL_PREFIX}{group_id}"
+
+    async def start(self):
+        self._pubsub = self.redis.pubsub()
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"Redis broadcast backend started (origin {self.origin})")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        self._channels.clear()
+        self._has_channels.clear()
+
+    async def subscribe(self, group_id: int):
+        channel = self.channel_for(group_id)
+        if channel in self._channels or self._pubsub is None:
+            return
+
+        self._channels.add(channel)
+        await self._pubsub.subscribe(channel)
+        self._has_channels.set()
+
+    async def unsubscribe(self, group_id: int):
+        channel = self.channel_for(group_id)
+        if channel not in self._channels or self._pubsub is None:
+            return
+
+        self._channels.discard(channel)
+        await self._pubsub.unsubscribe(channel)
+        if not self._channels:
+            self._has_channels.clear()
+
+    async def subscribe_users(self):
+        if self.USERS_CHANNEL in self._channels or self._pubsub is None:
+            return
+
+        self._channels.add(self.USERS_CHANNEL)
+        await self._pubsub.subscribe(self.USERS_CHANNEL)
+        self._has_channels.set()
+
+    async def publish_to_users(self, frames: Dict[int, str]):
+        await self._deliver_to_users_locally(frames)
+
+        lines = [f"{user_id}|{frame}" for user_id, frame in frames.items()]
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for i in range(0, len(lines), self.USERS_BATCH_SIZE):
+                    batch = "\n".join(lines[i:i + self.USERS_BATCH_SIZE])
+                    pipe.publish(self.USERS_CHANNEL, f"{self.origin}\n{batch}")
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish events for {len(frames)} users: {e}")
+
+    async def publish(self, group_id: int, frame: str, exclude_user: int = None, seq: int = None):
+        # Deliver on this worker right away instead of waiting for the round trip
+        await self._deliver_locally(group_id, frame, exclude_user)
+
+        envelope = f"{self.origin}|{group_id}|{exclude_user or ''}|{frame}"
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if seq is not None:
+                    events_key = self.EVENTS_KEY.format(group_id)
+                    pipe.rpush(events_key, f"{seq}|{exclude_user or ''}|{frame}")
+                    pipe.ltrim(events_key, -settings.REPLAY_BUFFER_SIZE, -1)
+                    pipe.expire(events_key, self.EVENTS_TTL_SECONDS)
+                pipe.publish(self.channel_for(group_id), envelope)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish event for group {group_id}: {e}")
+
+    async def next_sequence(self, group_id: int) -> int:
+        return await self.redis.incr(self.SEQUENCE_KEY.format(group_id))
+
+    async def replay(self, group_id: int, after_seq: int) -> Tuple[int, Optional[List[ReplayEvent]]]:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(self.SEQUENCE_KEY.format(group_id))
+            pipe.lrange(self.EVENTS_KEY.format(group_id), 0, -1)
+            latest, entries = await pipe.execute()
+
+        events = []
+        for entry in entries:
+            seq, exclude_user, frame = entry.split("|", 2)
+            events.append((int(seq), int(exclude_user) if exclude_user else None, frame))
+        latest = int(latest or 0)
+        return latest, self._events_after(latest, events, after_seq)
+
+    async def _listen(self):
+        """Receive events published by other workers"""
+        while True:
+            await self._has_channels.wait()
+            try:
+                event = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis broadcast listener error: {e}")
+                await asyncio.sleep(1.0)
+                continue
+
+            if event is None or event.get("type") != "message":
+                continue
+
+            if event["channel"] == self.USERS_CHANNEL:
+                await self._handle_users_event(event["data"])
+                continue
+
+            try:
+                origin, group_id, exclude_user, frame = event["data"].split("|", 3)
+                if origin == self.origin:
+                    continue
+                await self._deliver_locally(
+                    int(group_id),
+                    frame,
+                    int(exclude_user) if exclude_user else None
+                )
+            except Exception as e:
+                logger.error(f"Failed to deliver broadcast event: {e}")
+
+    async def _handle_users_event(self, data: str):
+        try:
+            origin, _, body = data.partition("\n")
+            if origin == self.origin:
+                return
+            frames = {}
+            for line in body.split("\n"):
+                user_id, frame = line.split("|", 1)
+                frames[int(user_id)] = frame
+            await self._deliver_to_users_locally(frames)
+        except Exception as e:
+            logger.error(f"Failed to deliver user events: {e}")
+
+
+def create_broadcast_backend() -> BroadcastBackend:
+    """Build the backend selected by BROADCAST_BACKEND"""
+    backend = settings.BROADCAST_BACKEND.lower()
+    if backend == "redis":
+        return RedisBroadcastBackend()
+    if backend != "memory":
+        logger.warning(f"Unknown BROADCAST_BACKEND '{settings.BROADCAST_BACKEND}', using memory")
+    return MemoryBroadcastBackend()
@@ -0,0 +1,71 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete
+from datetime import datetime
+from typing import List, Optional
+from app.models import ChatGroup, GroupMember
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GroupService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def add_member(self, group_id: int, user_id: int) -> GroupMember:
+        """Add a membership and bump the group's member_count
+
+        Both changes join the caller's transaction, so the count commits or
+        rolls back together with the membership row.
+        """
+        membership = GroupMember(
+            user_id=user_id,
+            group_id=group_id,
+            joined_at=datetime.utcnow()
+        )
+        self.db.add(membership)
+        await self.db.flush()
+        # Increment in SQL so concurrent joins cannot lose an update
+        await self.db.execute(
+            update(ChatGroup)
+            .where(ChatGroup.id == group_id)
+            .values(member_count=ChatGroup.member_count + 1)
+        )
+        return membership
+
+    async def remove_member(self, group_id: int, user_id: int) -> bool:
+        """Delete a membership and decrement member_count; False if there was none"""
+        result = await self.db.execute(
+            delete(GroupMember).where(
+                GroupMember.group_id == group_id,
+                GroupMember.user_id == user_id
+            )
+        )
+        if result.rowcount == 0:
+            return False
+
+        await self.db.execute(
+            update(ChatGroup)
+            .where(ChatGroup.id == group_id)
+            .values(member_count=ChatGroup.member_count - 1)
+        )
+        return True
+
+    async def get_user_groups(self, user_id: int, limit: Optional[int] = None, after_id: Optional[int] = None) -> List[ChatGroup]:
+        """Groups a user belongs to, ordered by id, in one query
+
+        Pass the last id of the previous page as after_id to continue.
+        """
+        stmt = (
+            select(ChatGroup)
+            .join(GroupMember, GroupMember.group_id == ChatGroup.id)
+            .where(GroupMember.user_id == user_id)
+            .order_by(ChatGroup.id)
+        )
+        if after_id is not None:
+            stmt = stmt.where(ChatGroup.id > after_id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
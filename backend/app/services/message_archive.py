@@ -0,0 +1,347 @@
+"""Cold storage for old chat messages
+
+Messages older than MESSAGE_ARCHIVE_AFTER_DAYS move out of the messages table
+into per-group segment files under MESSAGE_ARCHIVE_DIR:
+
+    group_<id>/<first created_at us>-<first id>.seg   zlib-compressed blocks of rows
+    group_<id>/<first created_at us>-<first id>.idx   one fixed-size entry per block
+
+Segments are written once (to a temp name, fsynced, then renamed) and never
+modified, so readers memory-map them and cache decoded blocks freely. Each index
+entry holds the block's first and last (created_at, id) key, its id range and
+its byte range, which is all a keyset page needs to find the blocks to inflate.
+A .seg without its .idx is an interrupted write and is ignored.
+
+Messages still referenced by a hot reply or a credit transaction stay in the
+table until the reference goes away, so the tiers can overlap in time; readers
+merge them by key instead of assuming cold is always older.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, distinct, exists, select
+from sqlalchemy.orm import aliased
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.models import CreditTransaction, Message
+
+logger = logging.getLogger(__name__)
+
+# (created_at in microseconds since the epoch, id): the order history is paged in
+MessageKey = Tuple[int, int]
+
+EPOCH = datetime(1970, 1, 1)
+INDEX_MAGIC = b"GCMIDX1\n"
+# first_us, first_id, last_us, last_id, min_id, max_id, offset, length, count
+INDEX_ENTRY = struct.Struct("<qqqqqqQII")
+BLOCK_ROWS = 256
+
+COLUMNS = [column.name for column in Message.__table__.columns]
+DATETIME_COLUMNS = {"created_at", "updated_at"}
+
+
+def to_micros(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def message_key(created_at: datetime, message_id: int) -> MessageKey:
+    return to_micros(created_at), message_id
+
+
+class Block:
+    __slots__ = ("segment", "first_key", "last_key", "min_id", "max_id", "offset", "length", "count")
+
+    def __init__(self, segment: "Segment", entry: tuple):
+        first_us, first_id, last_us, last_id, self.min_id, self.max_id, self.offset, self.length, self.count = entry
+        self.segment = segment
+        self.first_key = (first_us, first_id)
+        self.last_key = (last_us, last_id)
+
+
+class Segment:
+    def __init__(self, path: str, blocks_data: bytes):
+        self.path = path
+        self.blocks = [Block(self, entry) for entry in INDEX_ENTRY.iter_unpack(blocks_data)]
+
+
+class ColdMessageStore:
+    """Reads and writes a group's archived messages"""
+
+    # Open memory maps kept per worker
+    MAX_OPEN_SEGMENTS = 64
+
+    def __init__(self, root: str):
+        self.root = root
+        # {group_id: (directory mtime_ns, [Segment])}
+        self._segments: Dict[int, Tuple[int, List[Segment]]] = {}
+        self._maps: "OrderedDict[str, Tuple[object, mmap.mmap]]" = OrderedDict()
+        # {(segment path, offset): [(key, row)]}; blocks never change once written
+        self._blocks = TTLCache(300, 256)
+
+    def group_dir(self, group_id: int) -> str:
+        return os.path.join(self.root, f"group_{group_id}")
+
+    def segments(self, group_id: int) -> List[Segment]:
+        """Segments of a group, reloaded only when its directory changes"""
+        directory = self.group_dir(group_id)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            self._segments.pop(group_id, None)
+            return []
+
+        cached = self._segments.get(group_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        segments = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".idx"):
+                continue
+            with open(os.path.join(directory, name), "rb") as f:
+                data = f.read()
+            if not data.startswith(INDEX_MAGIC):
+                logger.warning(f"Skipping archive index with unknown format: {name}")
+                continue
+            segments.append(Segment(os.path.join(directory, name[:-4] + ".seg"), data[len(INDEX_MAGIC):]))
+        # Directory mtimes are coarse; only trust one that has settled
+        if time.time_ns() - mtime > 1_000_000_000:
+            self._segments[group_id] = (mtime, segments)
+        return segments
+
+    def bounds(self, group_id: int) -> Optional[Tuple[MessageKey, MessageKey]]:
+        """Smallest and largest archived key of a group, None if nothing is archived"""
+        blocks = [block for segment in self.segments(group_id) for block in segment.blocks]
+        if not blocks:
+            return None
+        return min(block.first_key for block in blocks), max(block.last_key for block in blocks)
+
+    def read_range(
+        self,
+        group_id: int,
+        lower: Optional[MessageKey],
+        upper: Optional[MessageKey],
+        limit: int,
+        descending: bool = True
+    ) -> List[dict]:
+        """Up to `limit` archived rows with lower < key < upper, nearest the open end first
+
+        Descending pages start below `upper`, ascending ones above `lower`.
+        Only blocks whose key range intersects the window are inflated.
+        """
+        blocks = [
+            block
+            for segment in self.segments(group_id)
+            for block in segment.blocks
+            if (lower is None or block.last_key > lower) and (upper is None or block.first_key < upper)
+        ]
+        # Visit blocks by the best key they could hold and stop once none can improve the page
+        if descending:
+            blocks.sort(key=lambda block: block.last_key, reverse=True)
+        else:
+            blocks.sort(key=lambda block: block.first_key)
+
+        found: List[Tuple[MessageKey, dict]] = []
+        for block in blocks:
+            if len(found) >= limit:
+                found.sort(key=lambda item: item[0], reverse=descending)
+                del found[limit:]
+                worst = found[-1][0]
+                if (block.last_key < worst) if descending else (block.first_key > worst):
+                    break
+            found.extend(
+                (key, row) for key, row in self._read_block(block)
+                if (lower is None or key > lower) and (upper is None or key < upper)
+            )
+
+        found.sort(key=lambda item: item[0], reverse=descending)
+        return [row for _, row in found[:limit]]
+
+    def existing_ids(self, group_id: int, rows: List[dict]) -> Set[int]:
+        """Ids among `rows` that are already archived (left over from an interrupted run)"""
+        if not rows:
+            return set()
+        keys = [message_key(row["created_at"], row["id"]) for row in rows]
+        low, high = min(keys), max(keys)
+        ids = {row["id"] for row in rows}
+        found = set()
+        for segment in self.segments(group_id):
+            for block in segment.blocks:
+                if block.last_key < low or block.first_key > high:
+                    continue
+                found.update(row["id"] for _, row in self._read_block(block) if row["id"] in ids)
+        return found
+
+    def write_segment(self, group_id: int, rows: List[dict]):
+        """Write rows (sorted by key) as a new immutable segment"""
+        directory = self.group_dir(group_id)
+        os.makedirs(directory, exist_ok=True)
+        first = rows[0]
+        name = f"{to_micros(first['created_at']):020d}-{first['id']:012d}"
+        segment_path = os.path.join(directory, name + ".seg")
+        index_path = os.path.join(directory, name + ".idx")
+
+        entries = []
+        offset = 0
+        with open(segment_path + ".tmp", "wb") as f:
+            for i in range(0, len(rows), BLOCK_ROWS):
+                chunk = rows[i:i + BLOCK_ROWS]
+                payload = zlib.compress(dumps({
+                    "columns": COLUMNS,
+                    "rows": [
+                        [
+                            row[column].isoformat() if column in DATETIME_COLUMNS and row[column] else row[column]
+                            for column in COLUMNS
+                        ]
+                        for row in chunk
+                    ]
+                }).encode(), 6)
+                f.write(payload)
+                first_us, first_id = message_key(chunk[0]["created_at"], chunk[0]["id"])
+                last_us, last_id = message_key(chunk[-1]["created_at"], chunk[-1]["id"])
+                ids = [row["id"] for row in chunk]
+                entries.append(INDEX_ENTRY.pack(
+                    first_us, first_id, last_us, last_id, min(ids), max(ids), offset, len(payload), len(chunk)
+                ))
+                offset += len(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(segment_path + ".tmp", segment_path)
+
+        # The index goes last: its presence marks the segment complete
+        with open(index_path + ".tmp", "wb") as f:
+            f.write(INDEX_MAGIC + b"".join(entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(index_path + ".tmp", index_path)
+
+    def _map(self, path: str) -> mmap.mmap:
+        entry = self._maps.get(path)
+        if entry is None:
+            f = open(path, "rb")
+            entry = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self._maps[path] = entry
+            while len(self._maps) > self.MAX_OPEN_SEGMENTS:
+                _, (old_file, old_map) = self._maps.popitem(last=False)
+                old_map.close()
+                old_file.close()
+        else:
+            self._maps.move_to_end(path)
+        return entry[1]
+
+    def _read_block(self, block: Block) -> List[Tuple[MessageKey, dict]]:
+        cache_key = (block.segment.path, block.offset)
+        decoded = self._blocks.get(cache_key)
+        if decoded is not None:
+            return decoded
+
+        data = self._map(block.segment.path)[block.offset:block.offset + block.length]
+        payload = loads(zlib.decompress(data))
+        columns = payload["columns"]
+        decoded = []
+        for values in payload["rows"]:
+            row = dict(zip(columns, values))
+            for column in DATETIME_COLUMNS:
+                if row.get(column):
+                    row[column] = datetime.fromisoformat(row[column])
+            decoded.append((message_key(row["created_at"], row["id"]), row))
+        self._blocks.set(cache_key, decoded)
+        return decoded
+
+    def close(self):
+        for f, mapped in self._maps.values():
+            mapped.close()
+            f.close()
+        self._maps.clear()
+
+
+class MessageArchiver:
+    """Moves old messages from the messages table into the cold store"""
+
+    def __init__(self, store: ColdMessageStore, session_factory=None, segment_rows: int = None, delete_batch: int = None):
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal as session_factory
+        self.store = store
+        self.session_factory = session_factory
+        self.segment_rows = segment_rows or settings.MESSAGE_ARCHIVE_SEGMENT_ROWS
+        self.delete_batch = delete_batch or settings.MESSAGE_ARCHIVE_DELETE_BATCH
+
+    async def archive(self, older_than: datetime) -> dict:
+        """Archive every message created before older_than; returns counts"""
+        stats = {"groups": 0, "archived": 0, "deleted": 0}
+        async with self.session_factory() as db:
+            result = await db.execute(select(distinct(Message.group_id)).where(Message.created_at < older_than))
+            group_ids = result.scalars().all()
+
+        for group_id in group_ids:
+            archived, deleted = await self.archive_group(group_id, older_than)
+            if deleted:
+                stats["groups"] += 1
+            stats["archived"] += archived
+            stats["deleted"] += deleted
+        return stats
+
+    async def archive_group(self, group_id: int, older_than: datetime) -> Tuple[int, int]:
+        """Archive one group's old messages a segment at a time; returns (archived, deleted)"""
+        reply = aliased(Message)
+        messages = Message.__table__
+        stmt = (
+            select(messages)
+            .where(
+                and_(
+                    messages.c.group_id == group_id,
+                    messages.c.created_at < older_than,
+                    # Rows a foreign key still points at stay hot for now
+                    ~exists().where(reply.reply_to_id == messages.c.id),
+                    ~exists().where(CreditTransaction.message_id == messages.c.id)
+                )
+            )
+            .order_by(messages.c.created_at, messages.c.id)
+            .limit(self.segment_rows)
+        )
+
+        archived = deleted = 0
+        while True:
+            async with self.session_factory() as db:
+                result = await db.execute(stmt)
+                rows = [dict(row) for row in result.mappings().all()]
+            if not rows:
+                return archived, deleted
+
+            # Rows already in a segment (a run interrupted before its delete) are only deleted
+            existing = self.store.existing_ids(group_id, rows)
+            new_rows = [row for row in rows if row["id"] not in existing]
+            if new_rows:
+                await asyncio.to_thread(self.store.write_segment, group_id, new_rows)
+                archived += len(new_rows)
+
+            deleted += await self._delete([row["id"] for row in rows])
+
+    async def _delete(self, ids: List[int]) -> int:
+        """Delete in small committed batches so no transaction holds locks for long"""
+        deleted = 0
+        for i in range(0, len(ids), self.delete_batch):
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    delete(Message.__table__).where(Message.__table__.c.id.in_(ids[i:i + self.delete_batch]))
+                )
+                await db.commit()
+            deleted += result.rowcount
+            # Let other writers in between batches
+            await asyncio.sleep(0.01)
+        return deleted
+
+
+cold_store = ColdMessageStore(settings.MESSAGE_ARCHIVE_DIR)
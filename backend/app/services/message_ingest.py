@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Message
+
+logger = logging.getLogger(__name__)
+
+# (column values, future resolved with the persisted Message)
+PendingMessage = Tuple[Dict, asyncio.Future]
+
+
+class MessageIngestBuffer:
+    """Group commit for chat messages
+
+    Concurrent sends are collected for up to window_ms and written by a single
+    flusher as one multi-row INSERT in one transaction, so a burst costs one
+    commit (and one fsync) instead of one per message. Each sender awaits its
+    own row and gets the Message back with its id, as if it had written it.
+
+    While a batch is being written new messages keep queueing, so batches grow
+    with load. Messages are only acknowledged after their batch commits; stop()
+    drains everything still queued. A batch the database rejects because of
+    one row is retried in halves, so only that sender gets the error. Before start() (scripts, tests) and with
+    MESSAGE_INGEST_WINDOW_MS=0 every message is written on its own.
+    """
+
+    def __init__(self, window_ms: int = None, max_batch: int = None):
+        if window_ms is None:
+            window_ms = settings.MESSAGE_INGEST_WINDOW_MS
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max_batch or settings.MESSAGE_INGEST_MAX_BATCH
+        self._pending: List[PendingMessage] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        # split_batches: retried in halves because one of their rows was rejected;
+        # failed_messages: rows rejected on their own; failed_batches: everything else
+        self.stats = {"messages": 0, "batches": 0, "split_batches": 0, "failed_messages": 0, "failed_batches": 0}
+
+    async def start(self):
+        if self._task is None and self.window_seconds > 0:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write everything still queued, then stop the flusher"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def submit(
+        self,
+        user_id: Optional[int],
+        group_id: int,
+        content: str,
+        ai_model: Optional[str] = None
+    ) -> Message:
+        """Queue a chat message and wait until it is committed
+
+        AI replies pass the model that wrote them and no user_id. Cancelling
+        the caller does not withdraw the message: once queued it is written
+        with its batch, so callers that broadcast it should shield that too.
+        """
+        # Every row has the same keys so a batch stays one multi-row INSERT
+        row = {
+            "content": content,
+            "user_id": user_id,
+            "group_id": group_id,
+            "is_ai_message": ai_model is not None,
+            "ai_model_used": ai_model,
+            "created_at": datetime.utcnow()
+        }
+        future = asyncio.get_running_loop().create_future()
+        if self._task is None:
+            await self._write([(row, future)])
+        else:
+            self._pending.append((row, future))
+            self._wakeup.set()
+        return await asyncio.shield(future)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                if not self._pending:
+                    continue
+                if not self._stopping and len(self._pending) < self.max_batch:
+                    # Idle until now: let concurrent senders join this batch.
+                    # Messages that queued during a write go out right away.
+                    await asyncio.sleep(self.window_seconds)
+
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            await self._write(batch)
+
+    async def _write(self, batch: List[PendingMessage]):
+        messages = Message.__table__
+        rows = [row for row, _ in batch]
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    insert(messages).returning(messages.c.id, sort_by_parameter_order=True),
+                    rows
+                )
+                ids = result.scalars().all()
+                await db.commit()
+        except (IntegrityError, DataError) as e:
+            # A rejected row (say its group was deleted after the membership
+            # check) must not fail everyone who shared the flush: retry in
+            # halves until only the offending message fails
+            if len(batch) > 1:
+                self.stats["split_batches"] += 1
+                middle = len(batch) // 2
+                await self._write(batch[:middle])
+                await self._write(batch[middle:])
+                return
+            self.stats["failed_messages"] += 1
+            logger.error(f"Rejected a message for group {rows[0]['group_id']}: {e}")
+            self._fail(batch, e)
+            return
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logger.error(f"Failed to write a batch of {len(batch)} messages: {e}")
+            self._fail(batch, e)
+            return
+
+        self.stats["messages"] += len(batch)
+        self.stats["batches"] += 1
+        for (row, future), message_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(Message(id=message_id, **row))
+
+    @staticmethod
+    def _fail(batch: List[PendingMessage], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+
+message_ingest = MessageIngestBuffer()
@@ -0,0 +1,243 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import column, func, literal_column, select, table
+from typing import Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.models import GroupMember, Message, User
+import base64
+import html
+import re
+import zlib
+
+# Letters and digits; underscores split words like the FTS tokenizers do
+WORD = re.compile(r"[^\W_]+")
+MAX_TERMS = 16
+SNIPPET_TOKENS = 32
+# Private-use characters mark matches in the database's highlight output; the
+# text is HTML-escaped first and then the markers become <mark> tags
+MARK_START, MARK_END = "\ue000", "\ue001"
+
+# SQLite: external-content FTS5 table created in migration 0005
+messages_fts = table("messages_fts", column("rowid"))
+FTS = literal_column("messages_fts")
+# Postgres: must match the expression of ix_messages_content_search (0005)
+SEARCH_CONFIG = literal_column("'simple'")
+HEADLINE_OPTIONS = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=" … "'
+
+
+def fts5_match(terms: List[str]):
+    # Quoted terms are plain tokens to FTS5, never query syntax
+    return FTS.op("MATCH")(" ".join(f'"{term}"' for term in terms) + "*")
+
+
+def tsquery(terms: List[str]):
+    return func.to_tsquery(SEARCH_CONFIG, " & ".join(terms) + ":*")
+
+
+def full_text(dialect: str, terms: List[str]):
+    """(FROM clause, match condition, score, id column) for a dialect
+
+    All terms must match, the last one as a prefix. Higher scores are
+    better. The id column is the one the index walks, so keyset bounds and
+    newest-first ordering on it are served by the index.
+    """
+    if dialect == "sqlite":
+        source = messages_fts.join(Message, Message.id == messages_fts.c.rowid)
+        # bm25() is lower for better matches
+        return source, fts5_match(terms), -func.bm25(FTS), messages_fts.c.rowid
+    tsvector = func.to_tsvector(SEARCH_CONFIG, Message.content)
+    query = tsquery(terms)
+    return Message.__table__, tsvector.op("@@")(query), func.ts_rank_cd(tsvector, query), Message.id
+
+
+# (message, sender username, score, highlighted HTML)
+SearchHit = Tuple[Message, Optional[str], float, str]
+
+
+class MessageSearchService:
+    """Ranked full-text search over messages in the groups a user belongs to
+
+    Matching uses the dialect's full-text index (FTS5 on SQLite, a GIN
+    tsvector index on Postgres): every word of the query has to appear, the
+    last one as a prefix so results follow the user as they type.
+
+    ``relevance`` ranks the newest MESSAGE_SEARCH_MAX_CANDIDATES matches, so a
+    query matching millions of messages costs the same as one matching a few
+    thousand; ``recent`` walks matches newest first with no cap and pages with
+    a keyset cursor. Relevance cursors carry the ids already returned, so
+    pages neither repeat nor skip a message while scores shift. Highlights
+    are only built for the rows of a page.
+    Archived messages (app.services.message_archive) are not searchable.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @staticmethod
+    def parse_terms(query: str) -> List[str]:
+        """Words of a free-text query; punctuation and operators are ignored"""
+        return WORD.findall(query.lower())[:MAX_TERMS]
+
+    async def search(
+        self,
+        user_id: int,
+        query: str,
+        group_id: Optional[int] = None,
+        sort: str = "relevance",
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Tuple[List[SearchHit], Optional[str]]:
+        """A page of hits and the cursor for the next page (None on the last)
+
+        Raises ValueError for a cursor that was not issued for this sort.
+        """
+        position = self.decode_cursor(cursor, sort) if cursor else None
+        terms = self.parse_terms(query)
+        if not terms:
+            return [], None
+
+        source, match, score, key = full_text(self.db.get_bind().dialect.name, terms)
+
+        if group_id is not None:
+            in_scope = Message.group_id == group_id
+        else:
+            in_scope = Message.group_id.in_(select(GroupMember.group_id).where(GroupMember.user_id == user_id))
+
+        matches = (
+            select(Message.id.label("id"), score.label("score"))
+            .select_from(source)
+            .where(match, in_scope)
+            .order_by(key.desc())
+        )
+
+        if sort == "recent":
+            if position:
+                matches = matches.where(key < position[0])
+            result = await self.db.execute(matches.limit(limit + 1))
+            page = [(row.id, row.score) for row in result]
+            has_more = len(page) > limit
+            page = page[:limit]
+            next_cursor = self.encode_cursor(sort, page[-1][0]) if has_more else None
+        else:
+            # Pin the candidate window to the newest match of the first page so
+            # messages sent while paging do not shift it
+            if position:
+                newest_id, seen = position
+                matches = matches.where(key <= newest_id)
+            else:
+                seen = set()
+            # Scores are recomputed on every request and bm25() depends on corpus
+            # statistics that inserts and archiving change, so a keyset on the
+            # score would duplicate or skip rows near the cursor. Each page
+            # instead re-ranks the window and leaves out the ids already returned.
+            candidates = matches.limit(settings.MESSAGE_SEARCH_MAX_CANDIDATES).subquery()
+            stmt = select(
+                candidates.c.id,
+                candidates.c.score,
+                func.max(candidates.c.id).over().label("newest_id")
+            ).order_by(candidates.c.score.desc(), candidates.c.id.desc()).limit(limit + 1 + len(seen))
+            result = await self.db.execute(stmt)
+            rows = result.all()
+            if not position and rows:
+                newest_id = rows[0].newest_id
+            unseen = [(row.id, row.score) for row in rows if row.id not in seen]
+            page = unseen[:limit]
+            if len(unseen) > limit:
+                seen.update(message_id for message_id, _ in page)
+                next_cursor = self.encode_cursor(sort, newest_id, self.pack_ids(seen))
+            else:
+                next_cursor = None
+
+        if not page:
+            return [], None
+        return await self._load_hits(page, terms), next_cursor
+
+    async def _load_hits(self, page: List[Tuple[int, float]], terms: List[str]) -> List[SearchHit]:
+        """Messages, senders and highlights for one page of ranked ids"""
+        ids = [message_id for message_id, _ in page]
+        result = await self.db.execute(
+            select(Message, User.username)
+            .outerjoin(User, User.id == Message.user_id)
+            .where(Message.id.in_(ids))
+        )
+        messages = {message.id: (message, username) for message, username in result.all()}
+        highlights = await self._get_highlights(ids, terms)
+
+        hits = []
+        for message_id, score in page:
+            if message_id not in messages:
+                continue  # Deleted between the two queries
+            message, username = messages[message_id]
+            highlight = highlights.get(message_id) or message.content
+            hits.append((message, username, score, self.render_highlight(highlight)))
+        return hits
+
+    async def _get_highlights(self, ids: List[int], terms: List[str]) -> Dict[int, str]:
+        if self.db.get_bind().dialect.name == "sqlite":
+            # FTS5 auxiliary functions only work in a query that runs the MATCH.
+            # A prefix MATCH pays for merging every word with that prefix each
+            # time it runs, and SQLite would run it once per value of a plain
+            # rowid IN (...); the "+ 0" keeps the IN out of FTS5, which then
+            # makes one pass over the page's rowid range.
+            stmt = select(
+                messages_fts.c.rowid,
+                func.snippet(FTS, 0, MARK_START, MARK_END, "…", SNIPPET_TOKENS)
+            ).where(
+                fts5_match(terms),
+                messages_fts.c.rowid.between(min(ids), max(ids)),
+                (messages_fts.c.rowid + 0).in_(ids)
+            )
+        else:
+            stmt = select(
+                Message.id,
+                func.ts_headline(SEARCH_CONFIG, Message.content, tsquery(terms), HEADLINE_OPTIONS)
+            ).where(Message.id.in_(ids))
+        result = await self.db.execute(stmt)
+        return dict(result.all())
+
+    @staticmethod
+    def render_highlight(text: str) -> str:
+        """HTML-escaped text with matches wrapped in <mark>"""
+        return html.escape(text).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+    @staticmethod
+    def pack_ids(ids: Set[int]) -> str:
+        """Sorted ids as hex gaps, which stay short within one candidate window"""
+        gaps, previous = [], 0
+        for message_id in sorted(ids):
+            gaps.append(format(message_id - previous, "x"))
+            previous = message_id
+        return ".".join(gaps)
+
+    @staticmethod
+    def unpack_ids(packed: str) -> Set[int]:
+        ids, current = set(), 0
+        for gap in packed.split(".") if packed else []:
+            current += int(gap, 16)
+            ids.add(current)
+        return ids
+
+    @staticmethod
+    def encode_cursor(sort: str, *position) -> str:
+        """Opaque cursor: the last id for ``recent``; the window's newest id
+        and the packed ids already returned for ``relevance``"""
+        raw = "|".join([sort] + [str(value) for value in position])
+        return base64.urlsafe_b64encode(zlib.compress(raw.encode())).decode().rstrip("=")
+
+    @classmethod
+    def decode_cursor(cls, cursor: str, sort: str) -> tuple:
+        """Inverse of encode_cursor; raises ValueError for malformed input"""
+        try:
+            raw = zlib.decompress(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))).decode()
+            kind, *values = raw.split("|")
+            if kind != sort:
+                raise ValueError(f"Cursor is for sort={kind}")
+            if sort == "recent":
+                (last_id,) = values
+                return (int(last_id),)
+            newest_id, packed = values
+            seen = cls.unpack_ids(packed)
+            if len(seen) > settings.MESSAGE_SEARCH_MAX_CANDIDATES:
+                raise ValueError("Cursor lists more ids than a candidate window holds")
+            return int(newest_id), seen
+        except (ValueError, UnicodeDecodeError, zlib.error) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
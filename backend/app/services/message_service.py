@@ -0,0 +1,144 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, tuple_
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from app.models import GroupMember, Message, User
+from app.services.message_archive import cold_store, message_key
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MessageService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def is_group_member(self, user_id: int, group_id: int) -> bool:
+        """Check whether a user belongs to a group"""
+        result = await self.db.execute(
+            select(GroupMember.user_id).where(
+                and_(
+                    GroupMember.user_id == user_id,
+                    GroupMember.group_id == group_id
+                )
+            )
+        )
+        return result.scalar_one_or_none() is not None
+
+    async def get_group_messages(
+        self,
+        group_id: int,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        offset: int = 0
+    ) -> List[Tuple[Message, Optional[str]]]:
+        """A page of (message, sender username), newest first
+
+        Pages are keyed on (created_at, id): ``before`` walks back into
+        history and ``after`` fetches newer messages, both at the cost of an
+        index seek however deep the page is. ``offset`` is kept for older
+        clients.
+
+        Archived history (app.services.message_archive) is merged in by key.
+        The cold tier is only read when the hot rows cannot fill the page alone.
+        """
+        bounds = cold_store.bounds(group_id)
+        if bounds is None:
+            return await self._get_hot_messages(group_id, limit, before, after, offset)
+
+        descending = after is None
+        fetch = limit + offset if descending else limit
+        rows = await self._get_hot_messages(group_id, fetch, before, after, 0)
+        lower = message_key(*after) if after else None
+        upper = message_key(*before) if before else None
+        cold_min, cold_max = bounds
+        if descending:
+            # Archived rows can only matter below the cursor and above the oldest hot row fetched
+            needs_cold = (upper is None or cold_min < upper) and (
+                len(rows) < fetch or message_key(rows[-1][0].created_at, rows[-1][0].id) < cold_max
+            )
+        else:
+            needs_cold = (lower is None or cold_max > lower) and (
+                len(rows) < fetch or message_key(rows[0][0].created_at, rows[0][0].id) > cold_min
+            )
+        if not needs_cold:
+            return rows[offset:offset + limit] if descending else rows
+
+        cold_rows = cold_store.read_range(group_id, lower, upper, fetch, descending)
+        hot_ids = {message.id for message, _ in rows}
+        # Rows left in both tiers by an interrupted archive run are served from the table
+        cold_rows = [row for row in cold_rows if row["id"] not in hot_ids]
+        usernames = await self._get_usernames({row["user_id"] for row in cold_rows if row["user_id"] is not None})
+        rows.extend((Message(**row), usernames.get(row["user_id"])) for row in cold_rows)
+        rows.sort(key=lambda item: message_key(item[0].created_at, item[0].id), reverse=True)
+        return rows[offset:offset + limit] if descending else rows[-limit:]
+
+    async def _get_hot_messages(
+        self,
+        group_id: int,
+        limit: int,
+        before: Optional[Tuple[datetime, int]],
+        after: Optional[Tuple[datetime, int]],
+        offset: int
+    ) -> List[Tuple[Message, Optional[str]]]:
+        """A page from the messages table in one query"""
+        key = tuple_(Message.created_at, Message.id)
+        stmt = (
+            select(Message, User.username)
+            .outerjoin(User, Message.user_id == User.id)
+            .where(Message.group_id == group_id)
+        )
+
+        if after is not None:
+            # Take the oldest rows past the cursor, then flip to newest first
+            stmt = stmt.where(key > tuple_(*after)).order_by(Message.created_at, Message.id).limit(limit)
+            result = await self.db.execute(stmt)
+            return list(reversed(result.all()))
+
+        if before is not None:
+            stmt = stmt.where(key < tuple_(*before))
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).offset(offset)
+        result = await self.db.execute(stmt)
+        return list(result.all())
+
+    async def _get_usernames(self, user_ids: Set[int]) -> Dict[int, str]:
+        if not user_ids:
+            return {}
+        result = await self.db.execute(select(User.id, User.username).where(User.id.in_(user_ids)))
+        return dict(result.all())
+
+    @staticmethod
+    def encode_cursor(message: Message) -> str:
+        """Opaque cursor for a message's (created_at, id) position"""
+        raw = f"{message.created_at.isoformat()}|{message.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """Inverse of encode_cursor; raises ValueError for malformed input"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, message_id = raw.rsplit("|", 1)
+            return datetime.fromisoformat(created_at), int(message_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def build_new_message_event(message: Message, sender_username: Optional[str], sender_email: Optional[str]) -> dict:
+        """Real-time payload broadcast to the group for a new message"""
+        return {
+            "type": "new_message",
+            "message": {
+                "id": message.id,
+                "content": message.content,
+                "user_id": message.user_id,
+                "sender_username": sender_username,
+                "user_email": sender_email,
+                "group_id": message.group_id,
+                "is_ai_message": message.is_ai_message,
+                "ai_model_used": message.ai_model_used,
+                "created_at": message.created_at.isoformat() if message.created_at else None,
+            }
+        }
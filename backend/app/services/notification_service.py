@@ -1,14 +1,21 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, desc
-from sqlalchemy.sql import func
+from sqlalchemy import select, and_, func, desc, insert, literal, or_, update, Integer, String
 from app.models import Notification, User
 from app.schemas.notification import NotificationCreate, NotificationUpdate
-from typing import Optional, List
+from app.core.cache import TTLCache
+from app.core.config import settings
+from typing import Any, Dict, Iterable, Optional, List
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# {user_id: {"total_count", "unread_count"}}; refreshed from the counters every write returns
+notification_count_cache = TTLCache(settings.NOTIFICATION_COUNT_CACHE_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+
+# Recipients per statement in bulk fan-out; keeps IN lists under driver parameter limits
+BULK_CHUNK = 5000
+
 
 class NotificationService:
     def __init__(self, db: AsyncSession):
@@ -26,12 +33,111 @@ class NotificationService:
         )
         
         self.db.add(notification)
+        await self.db.flush()
+        counts = await self._adjust_counts(notification_data.user_id, total=1, unread=1)
         await self.db.commit()
         await self.db.refresh(notification)
+        notification_count_cache.set(notification_data.user_id, counts)
         
         logger.info(f"Created notification for user {notification_data.user_id}: {notification_data.title}")
         return notification
     
+    async def create_notifications_bulk(
+        self,
+        user_ids: Iterable[int],
+        type: str,
+        title: str,
+        message: str,
+        data: Optional[Dict[str, Any]] = None,
+        related_id: Optional[int] = None,
+        push: bool = True
+    ) -> int:
+        """Create the same notification for many users in one transaction
+        
+        Rows and counters are written with one INSERT ... SELECT and one UPDATE
+        per chunk of users, without loading ORM objects, and with push=True
+        every recipient gets one "notification" event carrying the row and their
+        new unread count. Returns the number of notifications created.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return 0
+        
+        notifications = Notification.__table__
+        columns = ["type", "title", "message", "data", "user_id", "related_id", "is_read", "created_at"]
+        created = []
+        counts = {}
+        for i in range(0, len(user_ids), BULK_CHUNK):
+            chunk = user_ids[i:i + BULK_CHUNK]
+            # INSERT ... SELECT: one statement and one set of parameters per chunk,
+            # and ids without a users row are skipped instead of failing the batch
+            rows = (
+                select(
+                    literal(type),
+                    literal(title),
+                    literal(message),
+                    literal(json.dumps(data) if data else None, String),
+                    User.id,
+                    literal(related_id, Integer),
+                    literal(False),
+                    func.now()
+                )
+                .where(User.id.in_(chunk))
+            )
+            result = await self.db.execute(
+                insert(notifications)
+                .from_select(columns, rows)
+                .returning(notifications.c.id, notifications.c.user_id, notifications.c.created_at)
+            )
+            created.extend(result.all())
+            
+            counter_result = await self.db.execute(
+                update(User)
+                .where(User.id.in_(chunk))
+                .values(
+                    notification_count=User.notification_count + 1,
+                    unread_notification_count=User.unread_notification_count + 1,
+                    updated_at=User.updated_at
+                )
+                .returning(User.id, User.notification_count, User.unread_notification_count)
+                .execution_options(synchronize_session=False)
+            )
+            for user_id, total_count, unread_count in counter_result.all():
+                counts[user_id] = {"total_count": total_count, "unread_count": unread_count}
+        
+        await self.db.commit()
+        for user_id, user_counts in counts.items():
+            notification_count_cache.set(user_id, user_counts)
+        
+        logger.info(f"Created {len(created)} '{type}' notifications: {title}")
+        
+        if push:
+            from app.services.websocket_manager import manager
+            shared = {
+                "type": type,
+                "title": title,
+                "message": message,
+                "data": data,
+                "related_id": related_id,
+                "is_read": False,
+                "read_at": None
+            }
+            await manager.send_to_users({
+                user_id: {
+                    "type": "notification",
+                    "notification": {
+                        **shared,
+                        "id": notification_id,
+                        "user_id": user_id,
+                        "created_at": created_at.isoformat() if created_at else None
+                    },
+                    "unread_count": counts.get(user_id, {}).get("unread_count")
+                }
+                for notification_id, user_id, created_at in created
+            })
+        
+        return len(created)
+    
     async def get_user_notifications(
         self, 
         user_id: int, 
@@ -51,29 +157,42 @@ class NotificationService:
         return result.scalars().all()
     
     async def get_notification_counts(self, user_id: int) -> dict:
-        """Get notification counts for a user"""
-        # Total count
-        total_stmt = select(func.count()).select_from(Notification).where(Notification.user_id == user_id)
-        total_result = await self.db.execute(total_stmt)
-        total_count = total_result.scalar() or 0
-        
-        # Unread count  
-        unread_stmt = select(func.count()).select_from(Notification).where(
-            and_(
-                Notification.user_id == user_id,
-                Notification.is_read == False
-            )
-        )
-        unread_result = await self.db.execute(unread_stmt)
-        unread_count = unread_result.scalar() or 0
+        """Get notification counts for a user from the denormalized counters"""
+        counts = notification_count_cache.get(user_id)
+        if counts is not None:
+            return counts
         
-        return {
-            "total_count": total_count,
-            "unread_count": unread_count
+        result = await self.db.execute(
+            select(User.notification_count, User.unread_notification_count).where(User.id == user_id)
+        )
+        row = result.first()
+        counts = {
+            "total_count": row.notification_count if row else 0,
+            "unread_count": row.unread_notification_count if row else 0
         }
+        notification_count_cache.set(user_id, counts)
+        return counts
     
     async def mark_notification_as_read(self, notification_id: int, user_id: int) -> Optional[Notification]:
         """Mark a notification as read"""
+        # Only the request that flips is_read decrements the counter
+        result = await self.db.execute(
+            update(Notification).where(
+                and_(
+                    Notification.id == notification_id,
+                    Notification.user_id == user_id,
+                    Notification.is_read == False
+                )
+            ).values(
+                is_read=True,
+                read_at=func.now()
+            )
+        )
+        if result.rowcount:
+            counts = await self._adjust_counts(user_id, unread=-1)
+            await self.db.commit()
+            notification_count_cache.set(user_id, counts)
+        
         stmt = select(Notification).where(
             and_(
                 Notification.id == notification_id,
@@ -81,20 +200,10 @@ class NotificationService:
             )
         )
         result = await self.db.execute(stmt)
-        notification = result.scalar_one_or_none()
-        
-        if notification and not notification.is_read:
-            notification.is_read = True
-            notification.read_at = func.now()
-            await self.db.commit()
-            await self.db.refresh(notification)
-        
-        return notification
+        return result.scalar_one_or_none()
     
     async def mark_all_as_read(self, user_id: int) -> int:
         """Mark all notifications as read for a user"""
-        from sqlalchemy import update
-        
         stmt = update(Notification).where(
             and_(
                 Notification.user_id == user_id,
@@ -105,8 +214,64 @@ class NotificationService:
             read_at=func.now()
         )
         
+        result = await self.db.execute(stmt)
+        updated = result.rowcount
+        if updated:
+            counts = await self._adjust_counts(user_id, unread=-updated)
+            await self.db.commit()
+            notification_count_cache.set(user_id, counts)
+        return updated
+    
+    async def _adjust_counts(self, user_id: int, total: int = 0, unread: int = 0) -> dict:
+        """Apply a delta to the user's counters in the current transaction; returns the new counts"""
+        result = await self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(
+                notification_count=User.notification_count + total,
+                unread_notification_count=User.unread_notification_count + unread,
+                # Counter bumps are not profile changes
+                updated_at=User.updated_at
+            )
+            .returning(User.notification_count, User.unread_notification_count)
+        )
+        row = result.first()
+        return {
+            "total_count": row.notification_count if row else 0,
+            "unread_count": row.unread_notification_count if row else 0
+        }
+    
+    async def reconcile_counts(self, user_ids: Optional[List[int]] = None) -> int:
+        """Recompute counters from the notifications table; returns users repaired"""
+        total = (
+            select(func.count())
+            .where(Notification.user_id == User.id)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        unread = (
+            select(func.count())
+            .where(and_(Notification.user_id == User.id, Notification.is_read == False))
+            .correlate(User)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(User)
+            .where(or_(User.notification_count != total, User.unread_notification_count != unread))
+            .values(notification_count=total, unread_notification_count=unread, updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        if user_ids is not None:
+            stmt = stmt.where(User.id.in_(user_ids))
+        
         result = await self.db.execute(stmt)
         await self.db.commit()
+        
+        if user_ids is None:
+            notification_count_cache.clear()
+        else:
+            for user_id in user_ids:
+                notification_count_cache.invalidate(user_id)
         return result.rowcount
     
     async def create_group_invitation_notification(
@@ -131,4 +296,27 @@ class NotificationService:
             related_id=invitation_id
         )
         
-        return await self.create_notification(notification_data)
\ No newline at end of file
+        return await self.create_notification(notification_data)
+    
+    async def create_group_announcement_notifications(
+        self,
+        user_ids: Iterable[int],
+        group_id: int,
+        group_name: str,
+        announced_by_name: str,
+        title: str,
+        message: str
+    ) -> int:
+        """Notify group members of an announcement; returns the number notified"""
+        return await self.create_notifications_bulk(
+            user_ids,
+            type="group_announcement",
+            title=title,
+            message=message,
+            data={
+                "group_id": group_id,
+                "group_name": group_name,
+                "announced_by": announced_by_name
+            },
+            related_id=group_id
+        )
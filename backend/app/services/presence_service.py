@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncReadSessionLocal
+from app.models import GroupMember
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryPresenceStore:
+    """Single-process presence store"""
+
+    def __init__(self):
+        self._last_seen: Dict[int, float] = {}
+        self._sockets: Dict[int, int] = {}
+
+    async def connect(self, user_id: int, now: float) -> bool:
+        """Count a new socket; returns True if the user just came online"""
+        self._sockets[user_id] = self._sockets.get(user_id, 0) + 1
+        came_online = user_id not in self._last_seen
+        self._last_seen[user_id] = now
+        return came_online
+
+    async def disconnect(self, user_id: int) -> bool:
+        """Release a socket; returns True if the user just went offline"""
+        remaining = self._sockets.get(user_id, 0) - 1
+        if remaining > 0:
+            self._sockets[user_id] = remaining
+            return False
+        self._sockets.pop(user_id, None)
+        return self._last_seen.pop(user_id, None) is not None
+
+    async def touch(self, user_ids: List[int], now: float) -> List[int]:
+        """Refresh last-seen; returns users that were not online before"""
+        came_online = [user_id for user_id in user_ids if user_id not in self._last_seen]
+        for user_id in user_ids:
+            self._last_seen[user_id] = now
+        return came_online
+
+    async def last_seen(self, user_ids: List[int]) -> Dict[int, float]:
+        return {user_id: self._last_seen[user_id] for user_id in user_ids if user_id in self._last_seen}
+
+    async def expire(self, cutoff: float) -> List[int]:
+        """Drop users not seen since cutoff; returns the users removed"""
+        expired = [user_id for user_id, seen in self._last_seen.items() if seen < cutoff]
+        for user_id in expired:
+            del self._last_seen[user_id]
+            self._sockets.pop(user_id, None)
+        return expired
+
+
+class RedisPresenceStore:
+    """Presence shared by all workers
+
+    Last-seen timestamps live in one sorted set (user id scored by time), so
+    expiry is a range query on the score. Open sockets per user are counted in
+    a hash so a user only goes offline when their last socket on any worker
+    closes.
+    """
+
+    LAST_SEEN_KEY = "groupchat:presence:last_seen"
+    SOCKETS_KEY = "groupchat:presence:sockets"
+
+    def __init__(self, redis_client=None):
+        if redis_client is None:
+            from app.core.database import redis_client
+        self.redis = redis_client
+        # Let the keys disappear if every worker goes away
+        self.key_ttl = int(settings.PRESENCE_TTL_SECONDS * 10)
+
+    async def connect(self, user_id: int, now: float) -> bool:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self.SOCKETS_KEY, user_id, 1)
+            pipe.zadd(self.LAST_SEEN_KEY, {user_id: now})
+            pipe.expire(self.SOCKETS_KEY, self.key_ttl)
+            pipe.expire(self.LAST_SEEN_KEY, self.key_ttl)
+            _, added, _, _ = await pipe.execute()
+        return added == 1
+
+    async def disconnect(self, user_id: int) -> bool:
+        remaining = await self.redis.hincrby(self.SOCKETS_KEY, user_id, -1)
+        if remaining > 0:
+            return False
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self.SOCKETS_KEY, user_id)
+            pipe.zrem(self.LAST_SEEN_KEY, user_id)
+            _, removed = await pipe.execute()
+        return removed == 1
+
+    async def touch(self, user_ids: List[int], now: float) -> List[int]:
+        if not user_ids:
+            return []
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zmscore(self.LAST_SEEN_KEY, user_ids)
+            pipe.zadd(self.LAST_SEEN_KEY, {user_id: now for user_id in user_ids})
+            pipe.expire(self.LAST_SEEN_KEY, self.key_ttl)
+            scores, _, _ = await pipe.execute()
+        return [user_id for user_id, score in zip(user_ids, scores) if score is None]
+
+    async def last_seen(self, user_ids: List[int]) -> Dict[int, float]:
+        if not user_ids:
+            return {}
+        scores = await self.redis.zmscore(self.LAST_SEEN_KEY, user_ids)
+        return {user_id: score for user_id, score in zip(user_ids, scores) if score is not None}
+
+    async def expire(self, cutoff: float) -> List[int]:
+        stale = await self.redis.zrangebyscore(self.LAST_SEEN_KEY, "-inf", f"({cutoff}")
+        if not stale:
+            return []
+
+        # Every worker sweeps; only the one whose ZREM succeeds reports the user
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in stale:
+                pipe.zrem(self.LAST_SEEN_KEY, user_id)
+            removed = await pipe.execute()
+        expired = [int(user_id) for user_id, ok in zip(stale, removed) if ok]
+        if expired:
+            await self.redis.hdel(self.SOCKETS_KEY, *expired)
+        return expired
+
+
+def create_presence_store():
+    """Build the store selected by PRESENCE_BACKEND"""
+    if settings.PRESENCE_BACKEND.lower() == "redis":
+        return RedisPresenceStore()
+    return MemoryPresenceStore()
+
+
+class PresenceService:
+    """Tracks who is online and pushes presence changes to their groups"""
+
+    def __init__(
+        self,
+        emit: Callable[[int, dict], Awaitable[None]],
+        local_users: Callable[[], Iterable[int]],
+        store=None
+    ):
+        self.emit = emit
+        self.local_users = local_users
+        self.store = store or create_presence_store()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def user_connected(self, user_id: int):
+        if await self.store.connect(user_id, time.time()):
+            await self._announce(user_id, "online")
+
+    async def user_disconnected(self, user_id: int):
+        if await self.store.disconnect(user_id):
+            await self._announce(user_id, "offline")
+
+    async def heartbeat(self, user_ids: List[int]):
+        for user_id in await self.store.touch(user_ids, time.time()):
+            await self._announce(user_id, "online")
+
+    async def get_online_members(self, db: AsyncSession, group_ids: List[int]) -> Dict[int, List[int]]:
+        """Online members of many groups with one query and one store lookup"""
+        result = await db.execute(
+            select(GroupMember.group_id, GroupMember.user_id).where(GroupMember.group_id.in_(group_ids))
+        )
+        members = defaultdict(list)
+        for group_id, user_id in result.all():
+            members[group_id].append(user_id)
+
+        user_ids = list({user_id for users in members.values() for user_id in users})
+        cutoff = time.time() - settings.PRESENCE_TTL_SECONDS
+        seen = await self.store.last_seen(user_ids)
+        online = {user_id for user_id, last_seen in seen.items() if last_seen >= cutoff}
+
+        return {
+            group_id: [user_id for user_id in members.get(group_id, []) if user_id in online]
+            for group_id in group_ids
+        }
+
+    async def _announce(self, user_id: int, status: str):
+        """Push a presence change to every group the user belongs to"""
+        async with AsyncReadSessionLocal() as db:
+            result = await db.execute(select(GroupMember.group_id).where(GroupMember.user_id == user_id))
+            group_ids = result.scalars().all()
+
+        for group_id in group_ids:
+            await self.emit(group_id, {
+                "type": "presence_update",
+                "group_id": group_id,
+                "user_id": user_id,
+                "status": status
+            })
+
+    async def _run(self):
+        """Refresh users connected to this worker and expire everyone else"""
+        while True:
+            await asyncio.sleep(settings.PRESENCE_SWEEP_SECONDS)
+            try:
+                await self.heartbeat(list(self.local_users()))
+                cutoff = time.time() - settings.PRESENCE_TTL_SECONDS
+                for user_id in await self.store.expire(cutoff):
+                    await self._announce(user_id, "offline")
+            except Exception as e:
+                logger.error(f"Presence sweep failed: {e}")
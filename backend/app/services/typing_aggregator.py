@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TypingAggregator:
+    """Coalesces typing indicators into at most one frame per group per tick
+
+    Keystroke-level "typing" frames only refresh an expiry; a group is marked
+    dirty when someone starts or stops typing. Every tick each dirty group gets
+    a single "typing_update" frame listing who started and who stopped, so the
+    traffic is bounded by the number of active groups. Frames carry changes
+    rather than full rosters so updates from several workers compose on the
+    client.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[int, dict], Awaitable[None]],
+        tick_seconds: float = None,
+        ttl_seconds: float = None
+    ):
+        self.emit = emit
+        self.tick_seconds = tick_seconds or settings.TYPING_TICK_MS / 1000
+        self.ttl_seconds = ttl_seconds or settings.TYPING_TTL_SECONDS
+        # {group_id: {user_id: expires_at}}
+        self._typing: Dict[int, Dict[int, float]] = {}
+        # Pending changes per group: {group_id: {user_id: is_typing}}
+        self._changes: Dict[int, Dict[int, bool]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def start_typing(self, group_id: int, user_id: int):
+        """Record a typing frame; repeats only extend the expiry"""
+        users = self._typing.setdefault(group_id, {})
+        if user_id not in users:
+            self._record_change(group_id, user_id, True)
+        users[user_id] = time.monotonic() + self.ttl_seconds
+
+    def stop_typing(self, group_id: int, user_id: int):
+        """Record a stop frame; ignored if the user was not typing"""
+        users = self._typing.get(group_id)
+        if not users or users.pop(user_id, None) is None:
+            return
+        if not users:
+            del self._typing[group_id]
+        self._record_change(group_id, user_id, False)
+
+    def typing_users(self, group_id: int) -> List[int]:
+        return list(self._typing.get(group_id, ()))
+
+    def _record_change(self, group_id: int, user_id: int, is_typing: bool):
+        changes = self._changes.setdefault(group_id, {})
+        if changes.get(user_id) is (not is_typing):
+            # Started and stopped within one tick: nothing to tell clients
+            del changes[user_id]
+            if not changes:
+                del self._changes[group_id]
+        else:
+            changes[user_id] = is_typing
+
+    def _expire(self):
+        now = time.monotonic()
+        for group_id in list(self._typing):
+            for user_id, expires_at in list(self._typing[group_id].items()):
+                if expires_at <= now:
+                    self.stop_typing(group_id, user_id)
+
+    async def flush(self):
+        """Expire stale typers and emit one update per changed group"""
+        self._expire()
+        changes, self._changes = self._changes, {}
+
+        for group_id, users in changes.items():
+            await self.emit(group_id, {
+                "type": "typing_update",
+                "group_id": group_id,
+                "started": [user_id for user_id, typing in users.items() if typing],
+                "stopped": [user_id for user_id, typing in users.items() if not typing]
+            })
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Typing aggregator flush failed: {e}")
@@ -0,0 +1,331 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Row, and_, func, literal, literal_column, select
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.database import AsyncReadSessionLocal, engine
+from app.models import GroupMember, User
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+SEPARATORS = re.compile(r"[\s._\-+@]+")
+# A transaction that commits after a refresh can carry an older updated_at
+REFRESH_OVERLAP = timedelta(seconds=5)
+# More changed users than this (a bulk import) are cheaper to rebuild than to insert one by one
+REBUILD_ROWS = 10000
+# Words shorter than this only match as prefixes on SQLite
+TRIGRAM = 3
+
+# Postgres: must match the expression of ix_users_search_trgm (0006)
+search_text = func.lower(
+    User.username + literal_column("' '") + func.coalesce(User.full_name, literal_column("''"))
+    + literal_column("' '") + User.email
+)
+
+
+def user_words(username: str, email: str, full_name: Optional[str]) -> str:
+    """Lowercased words of the username, the email's local part and the name"""
+    return SEPARATORS.sub(" ", f"{username} {email.partition('@')[0]} {full_name or ''}".lower()).strip()
+
+
+def trigrams(tokens: Iterable[str]) -> Set[str]:
+    return {token[i:i + TRIGRAM] for token in tokens for i in range(len(token) - TRIGRAM + 1)}
+
+
+class UserSearchIndex:
+    """Per-worker prefix index over user names and emails, used on SQLite
+
+    A sorted list of "token\0id" keys, where tokens are the username and
+    email as a whole and the words of user_words(): a prefix lookup is a
+    binary search plus a walk over the matching keys, and exact tokens sort
+    before longer ones. For words inside a token ("smith" in "jsmith") each
+    trigram of the tokens maps to the sorted ids of the users that have it;
+    search_infix() walks the shortest of a word's lists and checks the others
+    by binary search. Inactive users are left out.
+
+    Searches never wait for it. start() builds it in the background (about
+    a minute and up to 1.5 GB per million users); until then
+    search() returns None. After that, users whose updated_at moved since
+    the previous refresh are fetched at most every
+    USER_SEARCH_REFRESH_SECONDS, also in the background, so changes made by
+    other workers show up too.
+    """
+
+    def __init__(self, refresh_seconds: float = None):
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else settings.USER_SEARCH_REFRESH_SECONDS
+        self._keys: List[str] = []
+        self._user_keys: Dict[int, Tuple[str, ...]] = {}
+        # Trigram -> ascending ids of the users with a token containing it
+        self._trigrams: Dict[str, array] = {}
+        self._built = False
+        # Users changed since this (database) time are fetched on the next refresh
+        self._since = None
+        self._checked_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._user_keys)
+
+    async def start(self):
+        """Build the index in the background; only SQLite deployments use it"""
+        if engine.dialect.name == "sqlite":
+            self.schedule_refresh()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule_refresh(self):
+        """Start a build or catch-up in the background if one is due"""
+        if self._task is not None and not self._task.done():
+            return
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = time.monotonic()
+        self._task = asyncio.create_task(self._refresh())
+
+    def search(self, prefix: str, limit: int) -> Optional[List[int]]:
+        """Ids of up to ``limit`` users with a token starting with ``prefix``,
+        exact and shorter tokens first; None until the index is built"""
+        if not self._built:
+            return None
+        ids: List[int] = []
+        seen = set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and len(ids) < limit:
+            key = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            user_id = int(key.rsplit("\0", 1)[1])
+            if user_id not in seen:
+                seen.add(user_id)
+                ids.append(user_id)
+            i += 1
+        return ids
+
+    def search_infix(self, fragment: str, limit: int, exclude: Set[int] = frozenset()) -> List[int]:
+        """Ids of up to ``limit`` users with a token containing ``fragment``,
+        leaving out ``exclude``; empty for fragments shorter than a trigram"""
+        if not self._built or len(fragment) < TRIGRAM:
+            return []
+        postings = [self._trigrams.get(trigram) for trigram in trigrams([fragment])]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        shortest, others = postings[0], postings[1:]
+        ids: List[int] = []
+        for user_id in shortest:
+            if user_id in exclude or not all(self._has(posting, user_id) for posting in others):
+                continue
+            # All trigrams can match without the word itself ("abcab" vs "xabcxbcab")
+            if any(fragment in token for token in self._tokens(self._user_keys.get(user_id, ()))):
+                ids.append(user_id)
+                if len(ids) >= limit:
+                    break
+        return ids
+
+    @staticmethod
+    def _has(posting: array, user_id: int) -> bool:
+        i = bisect_left(posting, user_id)
+        return i < len(posting) and posting[i] == user_id
+
+    @staticmethod
+    def _tokens(keys: Tuple[str, ...]) -> List[str]:
+        return [key.rsplit("\0", 1)[0] for key in keys]
+
+    async def _refresh(self):
+        columns = (User.id, User.username, User.email, User.full_name, User.is_active)
+        try:
+            async with AsyncReadSessionLocal() as db:
+                # Taken from the database clock that also stamps updated_at
+                result = await db.execute(select(func.now()))
+                started_at = result.scalar_one()
+                rebuild = self._since is None
+                if not rebuild:
+                    result = await db.execute(
+                        select(*columns).where(User.updated_at >= self._since).limit(REBUILD_ROWS + 1)
+                    )
+                    rows = result.all()
+                    rebuild = len(rows) > REBUILD_ROWS
+                    if not rebuild:
+                        for row in rows:
+                            self._upsert(row)
+                if rebuild:
+                    started = time.perf_counter()
+                    result = await db.execute(select(*columns))
+                    rows = result.all()
+                    # Sorting millions of keys would stall the event loop; searches
+                    # keep using the previous index until the new one is swapped in
+                    self._keys, self._user_keys, self._trigrams = await asyncio.to_thread(self._build, rows)
+                    self._built = True
+                    logger.info(f"Built user search index: {len(self)} users in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Failed to refresh the user search index: {e}")
+            return
+        self._since = started_at - REFRESH_OVERLAP
+
+    @staticmethod
+    def _keys_for(row) -> Tuple[str, ...]:
+        if not row.is_active:
+            return ()
+        tokens = set(user_words(row.username, row.email, row.full_name).split())
+        tokens.add(row.username.lower())
+        tokens.add(row.email.lower())
+        suffix = f"\0{row.id}"
+        return tuple(sorted([token + suffix for token in tokens]))
+
+    def _build(self, rows) -> Tuple[List[str], Dict[int, Tuple[str, ...]], Dict[str, array]]:
+        user_keys = {}
+        for row in rows:
+            keys = self._keys_for(row)
+            if keys:
+                user_keys[row.id] = keys
+        postings = defaultdict(list)
+        for user_id in sorted(user_keys):
+            for trigram in trigrams(self._tokens(user_keys[user_id])):
+                postings[trigram].append(user_id)
+        keys = sorted(key for keys in user_keys.values() for key in keys)
+        return keys, user_keys, {trigram: array("q", ids) for trigram, ids in postings.items()}
+
+    def _upsert(self, row):
+        old = self._user_keys.get(row.id, ())
+        new = self._keys_for(row)
+        if old == new:
+            return
+        for key in old:
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+        for key in new:
+            insort(self._keys, key)
+        old_trigrams, new_trigrams = trigrams(self._tokens(old)), trigrams(self._tokens(new))
+        for trigram in old_trigrams - new_trigrams:
+            posting = self._trigrams[trigram]
+            del posting[bisect_left(posting, row.id)]
+            if not posting:
+                del self._trigrams[trigram]
+        for trigram in new_trigrams - old_trigrams:
+            insort(self._trigrams.setdefault(trigram, array("q")), row.id)
+        if new:
+            self._user_keys[row.id] = new
+        else:
+            self._user_keys.pop(row.id, None)
+
+
+class UserSearchService:
+    """Autocomplete over active users, ranked for the person searching
+
+    Candidates come from an index (the in-memory UserSearchIndex on SQLite,
+    the pg_trgm GiST index on Postgres, nearest first) plus everyone sharing
+    a group with the searcher, whose number is bounded by group sizes. Both
+    dialects match words anywhere in a name or email: on SQLite the index's
+    trigrams top up its prefix matches when there are fewer than
+    USER_SEARCH_CANDIDATES of them. Only
+    those few hundred rows are ranked: exact username, then prefix matches,
+    then the number of shared groups, then shorter usernames.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search(self, user_id: int, query: str, limit: int = 10) -> List[Tuple[Row, int]]:
+        """Up to ``limit`` (user row, shared group count), best first
+
+        Rows carry id, username, email and full_name; the searcher is left out.
+        """
+        query = query.strip().lower()
+        words = [word for word in SEPARATORS.split(query) if word]
+        if not words:
+            return []
+
+        candidate_ids = set(await self._index_candidates(query, words))
+        my_groups = select(GroupMember.group_id).where(GroupMember.user_id == user_id)
+        result = await self.db.execute(
+            select(GroupMember.user_id.distinct())
+            .join(User, User.id == GroupMember.user_id)
+            .where(GroupMember.group_id.in_(my_groups), self._matches(words))
+            .limit(settings.USER_SEARCH_CANDIDATES)
+        )
+        candidate_ids.update(result.scalars())
+        candidate_ids.discard(user_id)
+        if not candidate_ids:
+            return []
+
+        result = await self.db.execute(
+            select(User.id, User.username, User.email, User.full_name)
+            .where(User.id.in_(candidate_ids), User.is_active == True)
+        )
+        users = result.all()
+        result = await self.db.execute(
+            select(GroupMember.user_id, func.count())
+            .where(GroupMember.user_id.in_(candidate_ids), GroupMember.group_id.in_(my_groups))
+            .group_by(GroupMember.user_id)
+        )
+        shared = dict(result.all())
+
+        ranked = []
+        for user in users:
+            key = self._rank(user, query, words, shared.get(user.id, 0))
+            if key is not None:
+                ranked.append((key, user))
+        ranked.sort(key=lambda item: item[0])
+        return [(user, shared.get(user.id, 0)) for _, user in ranked[:limit]]
+
+    async def _index_candidates(self, query: str, words: List[str]) -> List[int]:
+        limit = settings.USER_SEARCH_CANDIDATES
+        # The longest word is the most selective; _rank checks the others
+        word = max(words, key=len)
+        if self.db.get_bind().dialect.name == "sqlite":
+            user_search_index.schedule_refresh()
+            ids = user_search_index.search(word, limit)
+            if ids is None:
+                # Index still building: usernames starting with the word, from the
+                # unique index; words inside names are found once it is built
+                result = await self.db.execute(
+                    select(User.id)
+                    .where(User.username >= word, User.username < word + "\U0010ffff", User.is_active == True)
+                    .limit(limit)
+                )
+                ids = list(result.scalars())
+            elif len(ids) < limit:
+                ids.extend(user_search_index.search_infix(word, limit - len(ids), exclude=set(ids)))
+            return ids
+
+        result = await self.db.execute(
+            select(User.id)
+            .where(self._matches(words), User.is_active == True)
+            .order_by(literal(query).op("<<->")(search_text))
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    @staticmethod
+    def _matches(words: List[str]):
+        return and_(*(search_text.contains(word, autoescape=True) for word in words))
+
+    @staticmethod
+    def _rank(user: Row, query: str, words: List[str], shared: int):
+        """Sort key, or None when the user does not contain every word"""
+        username = user.username.lower()
+        email = user.email.lower()
+        text = f"{username} {(user.full_name or '').lower()} {email}"
+        if not all(word in text for word in words):
+            return None
+        word_starts = f" {user_words(user.username, user.email, user.full_name)}"
+        prefix = all(f" {word}" in word_starts or email.startswith(word) for word in words)
+        return (username != query, not prefix, -shared, len(username), username)
+
+
+user_search_index = UserSearchIndex()
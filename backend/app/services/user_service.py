@@ -1,8 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from sqlalchemy.sql import func
-from app.models import User
-from app.schemas.user import UserCreate
+from app.models import CreditTransaction, User
+from app.schemas.user import UserCreate, UserPrincipal
+from app.core.cache import TTLCache
 from app.core.security import get_password_hash
 from app.core.config import settings
 from typing import Optional
@@ -10,6 +11,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# {user_id: UserPrincipal}; every UserService method that changes a user invalidates its entry
+principal_cache = TTLCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+
 
 class UserService:
     def __init__(self, db: AsyncSession):
@@ -60,6 +64,19 @@ class UserService:
         result = await self.db.execute(select(User).where(User.id == user_id))
         return result.scalar_one_or_none()
     
+    async def get_principal(self, user_id: int) -> Optional[UserPrincipal]:
+        """Get the cached principal for a user, loading it on a miss"""
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+        
+        user = await self.get_user_by_id(user_id)
+        if user is None:
+            return None
+        principal = UserPrincipal.model_validate(user)
+        principal_cache.set(user_id, principal)
+        return principal
+    
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email"""
         result = await self.db.execute(select(User).where(User.email == email))
@@ -83,6 +100,7 @@ class UserService:
             .values(google_id=google_id, is_oauth=True, is_verified=True)
         )
         await self.db.commit()
+        principal_cache.invalidate(user_id)
         
         user = await self.get_user_by_id(user_id)
         logger.info(f"Linked Google account to user: {user.email}")
@@ -96,29 +114,90 @@ class UserService:
             .values(last_login=func.now())
         )
         await self.db.commit()
+        principal_cache.invalidate(user_id)
     
-    async def update_user_credits(self, user_id: int, amount: float) -> User:
-        """Update user's credits"""
+    async def update_user_credits(
+        self,
+        user_id: int,
+        amount: float,
+        transaction_type: str = "bonus",
+        description: Optional[str] = None
+    ) -> User:
+        """Add credits to a user account and record them in the ledger"""
         await self.db.execute(
             update(User)
             .where(User.id == user_id)
-            .values(credits=User.credits + amount)
+            # Balance changes are not profile changes
+            .values(credits=User.credits + amount, updated_at=User.updated_at)
         )
+        self.db.add(CreditTransaction(
+            user_id=user_id,
+            amount=amount,
+            transaction_type=transaction_type,
+            description=description
+        ))
         await self.db.commit()
+        principal_cache.invalidate(user_id)
         
         return await self.get_user_by_id(user_id)
     
-    async def deduct_credits(self, user_id: int, amount: float) -> bool:
-        """Deduct credits from user account"""
-        user = await self.get_user_by_id(user_id)
-        if not user or user.credits < amount:
-            return False
+    async def deduct_credits(
+        self,
+        user_id: int,
+        amount: float,
+        description: Optional[str] = None,
+        ai_model: Optional[str] = None
+    ) -> Optional[float]:
+        """Deduct credits and record the usage; returns the new balance, or None
+        when the user does not exist or cannot afford it
         
-        await self.db.execute(
+        The balance check and the deduction are a single conditional UPDATE, so
+        concurrent requests cannot overdraw the account, and the ledger row is
+        written in the same transaction.
+        """
+        result = await self.db.execute(
             update(User)
-            .where(User.id == user_id)
-            .values(credits=User.credits - amount)
+            .where(User.id == user_id, User.credits >= amount)
+            # Balance changes are not profile changes
+            .values(credits=User.credits - amount, updated_at=User.updated_at)
+            .returning(User.credits)
+            .execution_options(synchronize_session="fetch")
         )
+        balance = result.scalar_one_or_none()
+        if balance is None:
+            # Nothing was written, but the UPDATE opened the write transaction
+            await self.db.rollback()
+            return None
+        
+        self.db.add(CreditTransaction(
+            user_id=user_id,
+            amount=-amount,
+            transaction_type="usage",
+            description=description,
+            ai_model=ai_model
+        ))
         await self.db.commit()
+        principal_cache.invalidate(user_id)
+        
+        # SQLite's RETURNING hands back whole-number REALs as integers
+        return float(balance)
+    
+    async def update_profile(
+        self,
+        user: User,
+        username: Optional[str] = None,
+        full_name: Optional[str] = None,
+        email: Optional[str] = None
+    ) -> User:
+        """Update profile fields; full_name may be set to an empty string"""
+        if username:
+            user.username = username
+        if full_name is not None:
+            user.full_name = full_name
+        if email:
+            user.email = email
         
-        return True
\ No newline at end of file
+        await self.db.commit()
+        await self.db.refresh(user)
+        principal_cache.invalidate(user.id)
+        return user
@@ -1,161 +1,622 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Set
-import json
+from sqlalchemy import select, and_
+from typing import Dict, List, Optional, Set, Tuple, Union
+import asyncio
 import logging
+import time
+from app.core.config import settings
 from app.core.security import verify_token
+from app.core.serialization import dumps, loads, msgpack_available, msgpack_dumps, msgpack_loads
 from app.services.user_service import UserService
-from app.core.database import AsyncSessionLocal
+from app.core.read_routing import read_session_factory, recent_writers
+from app.models import GroupMember, Message
+from app.schemas.websocket import InboundFrame, ResumeFrame, SendMessageFrame, inbound_frame_adapter
+from app.services.broadcast import BroadcastBackend, create_broadcast_backend
+from app.services.message_ingest import message_ingest
+from app.services.message_service import MessageService
+from app.services.presence_service import PresenceService
+from app.services.typing_aggregator import TypingAggregator
 
 logger = logging.getLogger(__name__)
 
+# WebSocket subprotocols a client may request, mapped to the frame encoding
+SUBPROTOCOLS = {
+    "groupchat.json": "json",
+    "groupchat.msgpack": "msgpack",
+}
+
+
+class ConnectionContext:
+    """State for a single WebSocket, built once at handshake"""
+    
+    def __init__(self, websocket: WebSocket, user_id: int, encoding: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        # "json" (text frames) or "msgpack" (binary frames), negotiated at handshake
+        self.encoding = encoding
+        # Sender details for outgoing messages, loaded on first send_message
+        self.username: Optional[str] = None
+        self.email: Optional[str] = None
+        # Groups this socket joined; other tabs of the same user keep their own set
+        self.groups: Set[int] = set()
+        self.connected_at = time.time()
+        self.messages_received = 0
+        self.messages_sent = 0
+        # Refreshed by every inbound frame; drives the opt-in idle reaping
+        self.last_activity = time.monotonic()
+        # Bounded outbound queue, drained by writer_task
+        self.send_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.writer_task: Optional[asyncio.Task] = None
+        # closed: no more frames are queued; released: indexes and presence cleaned up
+        self.closed = False
+        self.released = False
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Store active connections: {user_id: {websockets}}
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
-        # Store group connections: {group_id: {user_ids}}
-        self.group_connections: Dict[int, Set[int]] = {}
+    def __init__(self, backend: BroadcastBackend = None):
+        # Store connection contexts per socket: {websocket: context}
+        self.connections: Dict[WebSocket, ConnectionContext] = {}
+        # Store active connections: {user_id: {contexts}}
+        self.active_connections: Dict[int, Set[ConnectionContext]] = {}
+        # Store group connections: {group_id: {contexts}}
+        self.group_connections: Dict[int, Set[ConnectionContext]] = {}
+        # Fan-out across workers; delivers back into _deliver_to_group on each worker
+        self.backend = backend or create_broadcast_backend()
+        self.backend.set_handler(self._deliver_to_group)
+        self.backend.set_user_handler(self._deliver_to_users)
+        # Coalesces typing/stop_typing frames into periodic per-group updates
+        self.typing = TypingAggregator(emit=self._send_ephemeral)
+        # Online status, fed by connect/disconnect/heartbeat
+        self.presence = PresenceService(emit=self._send_ephemeral, local_users=self.active_connections.keys)
+        # Connections closed by this worker, by reason, since startup
+        self.stats = {"reaped_idle": 0, "dropped_slow": 0, "send_failed": 0}
+        self._reaper_task: Optional[asyncio.Task] = None
+        # Closes and sends that outlive their caller; the loop only keeps weak references
+        self._background_tasks: Set[asyncio.Task] = set()
+    
+    async def start(self, serve_sockets: bool = True):
+        """Start the broadcast backend and background tasks
+        
+        A process that only publishes events (the REST API behind a separate
+        gateway) passes serve_sockets=False and skips the socket housekeeping.
+        """
+        await self.backend.start()
+        if not serve_sockets:
+            return
+        await self.backend.subscribe_users()
+        self.typing.start()
+        self.presence.start()
+        if settings.WS_IDLE_TIMEOUT_SECONDS > 0 and self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._run_reaper())
+    
+    async def stop(self):
+        """Stop background tasks and the broadcast backend"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            try:
+                await self._reaper_task
+            except asyncio.CancelledError:
+                pass
+            self._reaper_task = None
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.presence.stop()
+        await self.typing.stop()
+        await self.backend.stop()
     
-    async def connect(self, websocket: WebSocket, token: str):
-        """Connect a new WebSocket client"""
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, token: str) -> Optional[ConnectionContext]:
+        """Connect a new WebSocket client; returns None if the token is rejected"""
+        subprotocol = self._negotiate_subprotocol(websocket)
+        await websocket.accept(subprotocol=subprotocol)
         
         try:
-            # Verify token and get user
+            # Verify token once; the context carries the user for the socket's lifetime
             payload = verify_token(token)
             user_id = int(payload.get("sub"))
-            
-            # Store connection
-            if user_id not in self.active_connections:
-                self.active_connections[user_id] = set()
-            self.active_connections[user_id].add(websocket)
-            
-            logger.info(f"User {user_id} connected via WebSocket")
-            
-            # Send connection confirmation
-            await websocket.send_text(json.dumps({
-                "type": "connection_confirmed",
-                "user_id": user_id
-            }))
-            
         except Exception as e:
             logger.error(f"WebSocket connection error: {e}")
             await websocket.close(code=4001)
+            return None
+        
+        context = ConnectionContext(websocket, user_id, SUBPROTOCOLS.get(subprotocol, "json"))
+        self._register(context)
+        self._start_writer(context)
+        
+        logger.info(f"User {user_id} connected via WebSocket ({context.encoding})")
+        
+        # Send connection confirmation
+        self._send(context, {
+            "type": "connection_confirmed",
+            "user_id": user_id,
+            "encoding": context.encoding
+        })
+        
+        try:
+            await self.presence.user_connected(user_id)
+        except Exception as e:
+            logger.error(f"Failed to record presence for user {user_id}: {e}")
+        return context
+    
+    def _negotiate_subprotocol(self, websocket: WebSocket) -> Optional[str]:
+        """Pick the first supported subprotocol the client offered"""
+        for subprotocol in websocket.scope.get("subprotocols") or ():
+            if subprotocol == "groupchat.msgpack" and not msgpack_available():
+                continue
+            if subprotocol in SUBPROTOCOLS:
+                return subprotocol
+        return None
     
-    async def disconnect(self, websocket: WebSocket, token: str):
-        """Disconnect a WebSocket client"""
+    async def disconnect(self, context: ConnectionContext):
+        """Disconnect a WebSocket client; safe to call more than once"""
+        if context.released:
+            return
+        context.released = True
+        
+        for group_id in context.groups:
+            self.typing.stop_typing(group_id, context.user_id)
+        await self._release_groups(self._remove_connection(context))
+        
         try:
-            payload = verify_token(token)
-            user_id = int(payload.get("sub"))
-            
-            if user_id in self.active_connections:
-                self.active_connections[user_id].discard(websocket)
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
-            
-            logger.info(f"User {user_id} disconnected from WebSocket")
-            
+            await self.presence.user_disconnected(context.user_id)
         except Exception as e:
-            logger.error(f"WebSocket disconnection error: {e}")
+            logger.error(f"Failed to record presence for user {context.user_id}: {e}")
+        
+        logger.info(
+            f"User {context.user_id} disconnected from WebSocket after "
+            f"{time.time() - context.connected_at:.0f}s "
+            f"({context.messages_received} received, {context.messages_sent} sent)"
+        )
     
-    async def join_group(self, user_id: int, group_id: int):
-        """Join a user to a group for real-time updates"""
+    async def join_group(self, context: ConnectionContext, group_id: int):
+        """Subscribe a socket to a group's real-time updates; callers check membership"""
         if group_id not in self.group_connections:
             self.group_connections[group_id] = set()
-        self.group_connections[group_id].add(user_id)
+            await self.backend.subscribe(group_id)
+        self.group_connections[group_id].add(context)
+        context.groups.add(group_id)
         
-        logger.info(f"User {user_id} joined group {group_id} for real-time updates")
+        logger.info(f"User {context.user_id} joined group {group_id} for real-time updates")
     
-    async def leave_group(self, user_id: int, group_id: int):
-        """Remove user from group real-time updates"""
+    async def leave_group(self, context: ConnectionContext, group_id: int):
+        """Remove a socket from a group's real-time updates"""
+        context.groups.discard(group_id)
         if group_id in self.group_connections:
-            self.group_connections[group_id].discard(user_id)
+            self.group_connections[group_id].discard(context)
             if not self.group_connections[group_id]:
                 del self.group_connections[group_id]
+                await self.backend.unsubscribe(group_id)
         
-        logger.info(f"User {user_id} left group {group_id}")
+        logger.info(f"User {context.user_id} left group {group_id}")
     
-    async def send_to_user(self, user_id: int, message: dict):
-        """Send message to a specific user"""
-        if user_id in self.active_connections:
-            disconnected = set()
-            for websocket in self.active_connections[user_id]:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except:
-                    disconnected.add(websocket)
-            
-            # Remove disconnected websockets
-            for ws in disconnected:
-                self.active_connections[user_id].discard(ws)
+    def _register(self, context: ConnectionContext):
+        """Add a context to the socket and user indexes"""
+        self.connections[context.websocket] = context
+        if context.user_id not in self.active_connections:
+            self.active_connections[context.user_id] = set()
+        self.active_connections[context.user_id].add(context)
     
-    async def send_to_group(self, group_id: int, message: dict, exclude_user: int = None):
-        """Send message to all users in a group"""
-        print(f"send_to_group called - group_id: {group_id}, message_type: {message.get('type')}")
-        print(f"Current group connections: {list(self.group_connections.keys())}")
+    def _remove_connection(self, context: ConnectionContext) -> List[int]:
+        """Drop a context from every index and stop its writer
         
-        if group_id in self.group_connections:
-            user_list = list(self.group_connections[group_id])
-            print(f"Found {len(user_list)} users in group {group_id}: {user_list}")
-            
-            for user_id in user_list:
-                if exclude_user and user_id == exclude_user:
-                    print(f"Excluding user {user_id} from broadcast")
-                    continue
-                    
-                print(f"Sending to user {user_id}")
-                await self.send_to_user(user_id, message)
+        Only the groups the socket joined are touched. Returns the groups that
+        no longer have any local sockets. Calling it again is a no-op.
+        """
+        context.closed = True
+        
+        self.connections.pop(context.websocket, None)
+        user_contexts = self.active_connections.get(context.user_id)
+        if user_contexts is not None:
+            user_contexts.discard(context)
+            if not user_contexts:
+                del self.active_connections[context.user_id]
+        
+        emptied = []
+        for group_id in context.groups:
+            group_contexts = self.group_connections.get(group_id)
+            if group_contexts is None:
+                continue
+            group_contexts.discard(context)
+            if not group_contexts:
+                del self.group_connections[group_id]
+                emptied.append(group_id)
+        context.groups.clear()
+        
+        task = context.writer_task
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        return emptied
+    
+    async def _release_groups(self, group_ids: List[int]):
+        """Unsubscribe from groups that are still without local sockets"""
+        for group_id in group_ids:
+            if group_id not in self.group_connections:
+                await self.backend.unsubscribe(group_id)
+    
+    def _start_writer(self, context: ConnectionContext):
+        """Start the task that drains a socket's outbound queue"""
+        context.writer_task = asyncio.create_task(self._writer(context))
+    
+    async def _writer(self, context: ConnectionContext):
+        """Drain a socket's queue so a slow client only delays itself"""
+        try:
+            while True:
+                data = await context.send_queue.get()
+                if isinstance(data, bytes):
+                    await context.websocket.send_bytes(data)
+                else:
+                    await context.websocket.send_text(data)
+                context.messages_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send failed for user {context.user_id}: {e}")
+            self.stats["send_failed"] += 1
+            await self.disconnect(context)
+    
+    def _enqueue(self, context: ConnectionContext, data: Union[str, bytes]) -> bool:
+        """Queue a frame for a socket without waiting on the network"""
+        if context.closed:
+            return False
+        
+        try:
+            context.send_queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            self._drop_slow_consumer(context)
+            return False
+    
+    def _drop_slow_consumer(self, context: ConnectionContext):
+        """Disconnect a socket whose outbound queue overflowed"""
+        logger.warning(
+            f"Dropping slow WebSocket consumer for user {context.user_id} "
+            f"(queue of {settings.WS_SEND_QUEUE_SIZE} frames is full)"
+        )
+        self.stats["dropped_slow"] += 1
+        # Stop queueing right away; cleanup and close need the event loop
+        context.closed = True
+        self._spawn(self._close_connection(context, code=4008))
+    
+    def _spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference until it ends"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+    
+    def _background_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"WebSocket background task failed: {task.exception()}")
+    
+    async def _close_connection(self, context: ConnectionContext, code: int):
+        """Release a socket's state and close it from the server side"""
+        await self.disconnect(context)
+        try:
+            await context.websocket.close(code=code)
+        except Exception:
+            pass
+    
+    async def _run_reaper(self):
+        """Ping quiet sockets and close the ones that stopped answering
+        
+        Only runs when WS_IDLE_TIMEOUT_SECONDS is set. Half-open connections are
+        already closed by uvicorn's protocol-level pings, which browsers answer
+        on their own; this is for clients that reply to {"type": "ping"} frames
+        and should be dropped when their application stops responding.
+        """
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL_SECONDS)
+            try:
+                self.reap_idle()
+            except Exception as e:
+                logger.error(f"WebSocket reaper failed: {e}")
+    
+    def reap_idle(self, now: Optional[float] = None) -> int:
+        """Send pings and close idle sockets; returns the number reaped"""
+        if settings.WS_IDLE_TIMEOUT_SECONDS <= 0:
+            return 0
+        if now is None:
+            now = time.monotonic()
+        reaped = 0
+        for context in list(self.connections.values()):
+            if context.closed:
+                continue
+            idle = now - context.last_activity
+            if idle >= settings.WS_IDLE_TIMEOUT_SECONDS:
+                logger.info(f"Reaping idle WebSocket for user {context.user_id} ({idle:.0f}s without a frame)")
+                context.closed = True
+                self._spawn(self._close_connection(context, code=4000))
+                reaped += 1
+            elif idle >= settings.WS_PING_INTERVAL_SECONDS:
+                self._send(context, {"type": "ping"})
+        self.stats["reaped_idle"] += reaped
+        return reaped
+    
+    def get_stats(self) -> dict:
+        """Connection counts for this worker"""
+        return {
+            "connections": len(self.connections),
+            "users": len(self.active_connections),
+            "groups": len(self.group_connections),
+            "queued_frames": sum(context.send_queue.qsize() for context in self.connections.values()),
+            **self.stats
+        }
+    
+    async def send_to_user(self, user_id: int, message: dict):
+        """Send message to a specific user, on every worker"""
+        await self.send_to_users({user_id: message})
+    
+    async def send_to_users(self, messages: Dict[int, dict]):
+        """Send each user their own message in one publish, on every worker"""
+        if messages:
+            await self.backend.publish_to_users({user_id: dumps(message) for user_id, message in messages.items()})
+    
+    async def _deliver_to_users(self, frames: Dict[int, str]):
+        """Deliver user-addressed frames to the sockets held by this worker"""
+        for user_id, frame in frames.items():
+            if user_id in self.active_connections:
+                self._send_frame_to_user(user_id, frame)
+    
+    def _send_frame_to_user(self, user_id: int, frame: str):
+        binary_frame = None
+        for context in list(self.active_connections.get(user_id, ())):
+            if context.encoding == "msgpack":
+                if binary_frame is None:
+                    binary_frame = self._to_msgpack(frame)
+                self._enqueue(context, binary_frame)
+            else:
+                self._enqueue(context, frame)
+    
+    def _send(self, context: ConnectionContext, message: dict):
+        """Encode a message for one socket and queue it"""
+        if context.encoding == "msgpack":
+            self._enqueue(context, msgpack_dumps(message))
         else:
-            print(f"No connections found for group {group_id}")
+            self._enqueue(context, dumps(message))
+    
+    @staticmethod
+    def _to_msgpack(frame: str) -> bytes:
+        """Re-encode a shared JSON frame for binary clients"""
+        return msgpack_dumps(loads(frame))
+    
+    async def send_to_group(
+        self,
+        group_id: int,
+        message: dict,
+        exclude_user: int = None,
+        replayable: bool = True
+    ) -> Optional[int]:
+        """Send message to all users in a group, on every worker
+        
+        Replayable events get the group's next sequence number as "seq" and are
+        kept for reconnecting clients; returns that number.
+        """
+        seq = None
+        if replayable:
+            seq = await self.backend.next_sequence(group_id)
+            message = {**message, "seq": seq}
+        
+        # Encode once; every recipient socket and worker shares the same frame
+        await self.backend.publish(group_id, dumps(message), exclude_user, seq=seq)
+        return seq
     
-    async def listen_for_messages(self, websocket: WebSocket, token: str):
+    async def _send_ephemeral(self, group_id: int, message: dict):
+        """Broadcast an event that is not sequenced or replayed (typing, presence)"""
+        await self.send_to_group(group_id, message, replayable=False)
+    
+    async def _deliver_to_group(self, group_id: int, frame: str, exclude_user: int = None):
+        """Deliver an encoded group frame to the sockets held by this worker"""
+        if group_id not in self.group_connections:
+            return
+        
+        # Binary clients share one MessagePack copy, built only if one is present
+        binary_frame = None
+        for context in list(self.group_connections[group_id]):
+            if exclude_user and context.user_id == exclude_user:
+                continue
+            if context.encoding == "msgpack":
+                if binary_frame is None:
+                    binary_frame = self._to_msgpack(frame)
+                self._enqueue(context, binary_frame)
+            else:
+                self._enqueue(context, frame)
+    
+    async def listen_for_messages(self, context: ConnectionContext):
         """Listen for incoming WebSocket messages"""
         try:
-            payload = verify_token(token)
-            user_id = int(payload.get("sub"))
-            
             while True:
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                data = await context.websocket.receive()
+                if data["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(data.get("code", 1000))
+                context.messages_received += 1
+                context.last_activity = time.monotonic()
                 
-                await self.handle_message(user_id, message)
+                try:
+                    frame = self._decode_frame(context, data)
+                except ValueError as e:
+                    # Covers schema validation and malformed JSON/MessagePack
+                    logger.debug(f"Invalid WebSocket frame from user {context.user_id}: {e}")
+                    self._send_error(context, "Invalid frame")
+                    continue
+                
+                await self.handle_message(context, frame)
                 
         except WebSocketDisconnect:
-            logger.info(f"WebSocket disconnected for user {user_id}")
+            logger.info(f"WebSocket disconnected for user {context.user_id}")
         except Exception as e:
             logger.error(f"Error in WebSocket listener: {e}")
     
-    async def handle_message(self, user_id: int, message: dict):
-        """Handle incoming WebSocket messages"""
-        message_type = message.get("type")
-        
-        if message_type == "join_group":
-            group_id = message.get("group_id")
-            if group_id:
-                await self.join_group(user_id, group_id)
-        
-        elif message_type == "leave_group":
-            group_id = message.get("group_id")
-            if group_id:
-                await self.leave_group(user_id, group_id)
-        
-        elif message_type == "typing":
-            group_id = message.get("group_id")
-            if group_id:
-                await self.send_to_group(group_id, {
-                    "type": "user_typing",
-                    "user_id": user_id,
-                    "group_id": group_id
-                }, exclude_user=user_id)
-        
-        elif message_type == "stop_typing":
-            group_id = message.get("group_id")
-            if group_id:
-                await self.send_to_group(group_id, {
-                    "type": "user_stopped_typing",
-                    "user_id": user_id,
-                    "group_id": group_id
-                }, exclude_user=user_id)
+    def _decode_frame(self, context: ConnectionContext, data: dict) -> InboundFrame:
+        """Decode and validate one inbound frame in the socket's encoding"""
+        if data.get("text") is not None:
+            return inbound_frame_adapter.validate_json(data["text"])
+        if context.encoding == "msgpack":
+            return inbound_frame_adapter.validate_python(msgpack_loads(data["bytes"]))
+        return inbound_frame_adapter.validate_json(data.get("bytes") or b"")
+    
+    async def handle_message(self, context: ConnectionContext, frame: InboundFrame):
+        """Handle a validated inbound frame"""
+        user_id = context.user_id
+        
+        if frame.type == "join_group":
+            await self.handle_join_group(context, frame.group_id)
+        
+        elif frame.type == "leave_group":
+            await self.leave_group(context, frame.group_id)
+        
+        # Typing is only relayed into groups this socket joined, which requires membership
+        elif frame.type == "typing":
+            if frame.group_id in context.groups:
+                self.typing.start_typing(frame.group_id, user_id)
+        
+        elif frame.type == "stop_typing":
+            if frame.group_id in context.groups:
+                self.typing.stop_typing(frame.group_id, user_id)
+        
+        elif frame.type == "heartbeat":
+            await self.presence.heartbeat([user_id])
+        
+        elif frame.type == "pong":
+            # Receiving it already refreshed last_activity
+            pass
+        
+        elif frame.type == "resume":
+            await self.handle_resume(context, frame)
+        
+        elif frame.type == "send_message":
+            try:
+                await self.handle_send_message(context, frame)
+            except Exception as e:
+                logger.error(f"Failed to send message for user {user_id}: {e}")
+                self._send_error(context, "Failed to send message", frame.client_id)
+    
+    async def handle_join_group(self, context: ConnectionContext, group_id: int):
+        """Join a group requested by the client, if the user is a member"""
+        if group_id in context.groups:
+            return
+        
+        session_factory = await read_session_factory(context.user_id)
+        async with session_factory() as db:
+            is_member = await MessageService(db).is_group_member(context.user_id, group_id)
+        if not is_member:
+            self._send_error(context, "Not a member of this group")
+            return
+        
+        await self.join_group(context, group_id)
+    
+    async def handle_send_message(self, context: ConnectionContext, frame: SendMessageFrame):
+        """Persist and fan out a chat message sent over the socket, then ack it"""
+        group_id = frame.group_id
+        client_id = frame.client_id
+        
+        # Read-only checks; the insert itself goes through the group-commit buffer
+        session_factory = await read_session_factory(context.user_id)
+        async with session_factory() as db:
+            if not await MessageService(db).is_group_member(context.user_id, group_id):
+                self._send_error(context, "Not a member of this group", client_id)
+                return
+            
+            if context.username is None:
+                user = await UserService(db).get_principal(context.user_id)
+                if user is None:
+                    self._send_error(context, "User not found", client_id)
+                    return
+                context.username, context.email = user.username, user.email
+        
+        # Once queued the message is committed even if this socket goes away,
+        # so the broadcast must not be cancelled with it either
+        new_message, seq = await asyncio.shield(self._spawn(
+            self._persist_and_broadcast(context.user_id, context.username, context.email, group_id, frame.content)
+        ))
+        
+        self._send(context, {
+            "type": "message_ack",
+            "client_id": client_id,
+            "message_id": new_message.id,
+            "group_id": group_id,
+            "seq": seq,
+            "created_at": new_message.created_at.isoformat()
+        })
+    
+    async def _persist_and_broadcast(
+        self,
+        user_id: int,
+        username: Optional[str],
+        email: Optional[str],
+        group_id: int,
+        content: str
+    ) -> Tuple[Message, int]:
+        new_message = await message_ingest.submit(user_id, group_id, content)
+        # A history fetch over REST right after sending must not hit a lagging replica
+        await recent_writers.mark(user_id)
+        
+        seq = await self.send_to_group(
+            group_id,
+            MessageService.build_new_message_event(new_message, username, email),
+            exclude_user=user_id
+        )
+        return new_message, seq
+    
+    async def handle_resume(self, context: ConnectionContext, frame: ResumeFrame):
+        """Re-join groups after a reconnect and replay the events that were missed
+        
+        The client sends {"groups": {group_id: last_seen_seq}}. Groups are joined
+        before replaying, so clients should drop frames with a seq they already
+        have. When the gap is larger than the replay buffer the client gets
+        resume_gap and should refetch history over REST.
+        """
+        last_seen = frame.groups
+        if not last_seen:
+            return
+        
+        session_factory = await read_session_factory(context.user_id)
+        async with session_factory() as db:
+            result = await db.execute(
+                select(GroupMember.group_id).where(
+                    and_(
+                        GroupMember.user_id == context.user_id,
+                        GroupMember.group_id.in_(list(last_seen))
+                    )
+                )
+            )
+            member_group_ids = set(result.scalars().all())
+        
+        latest_seqs = {}
+        for group_id, after_seq in last_seen.items():
+            if group_id not in member_group_ids:
+                continue
+            
+            await self.join_group(context, group_id)
+            latest, events = await self.backend.replay(group_id, after_seq)
+            latest_seqs[group_id] = latest
+            
+            if events is None:
+                self._send(context, {
+                    "type": "resume_gap",
+                    "group_id": group_id,
+                    "seq": latest
+                })
+                continue
+            
+            for _, exclude_user, event_frame in events:
+                if exclude_user == context.user_id:
+                    continue
+                if context.encoding == "msgpack":
+                    self._enqueue(context, self._to_msgpack(event_frame))
+                else:
+                    self._enqueue(context, event_frame)
+        
+        self._send(context, {
+            "type": "resume_complete",
+            "groups": latest_seqs
+        })
+    
+    def _send_error(self, context: ConnectionContext, detail: str, client_id=None):
+        self._send(context, {
+            "type": "error",
+            "client_id": client_id,
+            "detail": detail
+        })
 
 
 # Global connection manager instance
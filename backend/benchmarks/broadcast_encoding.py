@@ -0,0 +1,92 @@
+"""Per-broadcast CPU cost of encoding a group event.
+
+Compares the previous behaviour (json.dumps for every recipient socket) with
+the current ConnectionManager path (one shared frame per broadcast).
+
+    cd backend && python benchmarks/broadcast_encoding.py --recipients 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.broadcast import MemoryBroadcastBackend
+from app.services.websocket_manager import ConnectionContext, ConnectionManager
+
+
+class NullWebSocket:
+    """Socket that accepts frames without doing any I/O"""
+
+    async def send_text(self, text: str):
+        pass
+
+
+def sample_event(i: int) -> dict:
+    return {
+        "type": "new_message",
+        "message": {
+            "id": i,
+            "content": "Has anyone looked at the deployment checklist for tomorrow? " * 2,
+            "user_id": 42,
+            "sender_username": "alice",
+            "user_email": "alice@example.com",
+            "group_id": 1,
+            "is_ai_message": False,
+            "created_at": "2024-05-01T12:00:00.000000",
+        }
+    }
+
+
+def bench_per_socket(recipients: int, broadcasts: int) -> float:
+    """Previous path: serialize once per recipient socket"""
+    sockets = [asyncio.Queue() for _ in range(recipients)]
+    start = time.process_time()
+    for i in range(broadcasts):
+        message = sample_event(i)
+        for queue in sockets:
+            queue.put_nowait(json.dumps(message))
+        for queue in sockets:
+            queue.get_nowait()
+    return (time.process_time() - start) / broadcasts
+
+
+async def bench_encode_once(recipients: int, broadcasts: int) -> float:
+    """Current path: ConnectionManager.send_to_group with a shared frame"""
+    settings.WS_SEND_QUEUE_SIZE = broadcasts + 1
+    manager = ConnectionManager(backend=MemoryBroadcastBackend())
+    for user_id in range(1, recipients + 1):
+        # Registered without a writer task so only the broadcast itself is timed
+        context = ConnectionContext(NullWebSocket(), user_id)
+        manager._register(context)
+        await manager.join_group(context, 1)
+
+    start = time.process_time()
+    for i in range(broadcasts):
+        await manager.send_to_group(1, sample_event(i))
+        for context in manager.connections.values():
+            context.send_queue.get_nowait()
+    return (time.process_time() - start) / broadcasts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=1000)
+    parser.add_argument("--broadcasts", type=int, default=200)
+    args = parser.parse_args()
+
+    before = bench_per_socket(args.recipients, args.broadcasts)
+    after = asyncio.run(bench_encode_once(args.recipients, args.broadcasts))
+
+    print(f"recipients per broadcast: {args.recipients}")
+    print(f"json.dumps per socket:    {before * 1000:.3f} ms CPU / broadcast")
+    print(f"encode once:              {after * 1000:.3f} ms CPU / broadcast")
+    print(f"speedup:                  {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Concurrent credit deduction check.
+
+Creates a user with --balance credits and fires --requests simultaneous
+UserService.deduct_credits calls of --amount each, spread over --processes
+worker processes with their own connection pools, then checks that the
+balance never went negative, that exactly as many deductions succeeded as
+the balance covers and that the ledger has one usage row per success.
+Exits non-zero if any check fails. tests/test_user_service.py runs the same
+checks within one process on every pytest run; this script adds several
+processes and larger volumes.
+
+Runs against a throwaway SQLite database unless --database-url points at an
+already migrated one; the user it creates is removed again afterwards. The
+SQLite database uses SQLITE_PERFORMANCE_MODE, the configuration for several
+worker processes; --no-performance-mode uses the default one-pool setup, where
+hundreds of concurrent writers can outlast the busy timeout.
+
+    cd backend && python benchmarks/credit_deduction.py --requests 500 --processes 4
+    cd backend && python benchmarks/credit_deduction.py --database-url postgresql+asyncpg://localhost/groupchatai
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def worker(user_id: int, count: int, amount: float, barrier, results):
+    results.put(asyncio.run(deduct_all(user_id, count, amount, barrier)))
+
+
+async def deduct_all(user_id: int, count: int, amount: float, barrier):
+    # Settings are read at import time; the parent set the environment
+    from app.core.database import AsyncSessionLocal, dispose_engines
+    from app.services.user_service import UserService
+
+    async def deduct():
+        async with AsyncSessionLocal() as db:
+            return await UserService(db).deduct_credits(user_id, amount, description="credit deduction check")
+
+    # Imports and the first connection are not part of the timing
+    await warm_up(AsyncSessionLocal)
+    await asyncio.to_thread(barrier.wait)
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(deduct() for _ in range(count)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    await dispose_engines()
+
+    errors = [repr(outcome) for outcome in outcomes if isinstance(outcome, Exception)]
+    balances = [outcome for outcome in outcomes if outcome is not None and not isinstance(outcome, Exception)]
+    return balances, errors, elapsed
+
+
+async def warm_up(session_factory):
+    from sqlalchemy import select
+
+    async with session_factory() as db:
+        await db.execute(select(1))
+
+
+async def create_user(balance: float) -> int:
+    from app.core.database import AsyncSessionLocal, dispose_engines, engine
+    from app.core.migrations import upgrade_to_head
+    from app.models import User
+
+    if engine.dialect.name == "sqlite":
+        await upgrade_to_head(engine)
+    token = uuid.uuid4().hex[:12]
+    async with AsyncSessionLocal() as db:
+        user = User(
+            email=f"credit-check-{token}@bench.local",
+            username=f"credit-check-{token}",
+            hashed_password="x",
+            credits=balance
+        )
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+    await dispose_engines()
+    return user_id
+
+
+async def inspect_and_remove_user(user_id: int):
+    from sqlalchemy import delete, func, select
+    from app.core.database import AsyncSessionLocal, dispose_engines
+    from app.models import CreditTransaction, User
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.credits).where(User.id == user_id))
+        balance = result.scalar_one()
+        result = await db.execute(
+            select(func.count(), func.coalesce(func.sum(CreditTransaction.amount), 0.0))
+            .where(CreditTransaction.user_id == user_id, CreditTransaction.transaction_type == "usage")
+        )
+        ledger_rows, ledger_total = result.one()
+        await db.execute(delete(CreditTransaction).where(CreditTransaction.user_id == user_id))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+    await dispose_engines()
+    return balance, ledger_rows, ledger_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--balance", type=float, default=100.0)
+    parser.add_argument("--amount", type=float, default=1.0)
+    parser.add_argument("--database-url", help="Migrated database to use instead of a throwaway SQLite file")
+    parser.add_argument("--no-performance-mode", action="store_true", help="Do not set SQLITE_PERFORMANCE_MODE")
+    args = parser.parse_args()
+
+    db_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        db_dir = tempfile.mkdtemp(prefix="groupchat-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_dir}/bench.db"
+        os.environ["SQLITE_PERFORMANCE_MODE"] = "false" if args.no_performance_mode else "true"
+
+    try:
+        user_id = asyncio.run(create_user(args.balance))
+
+        # Spawned workers get fresh engines and inherit the environment
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(args.processes)
+        results = context.Queue()
+        shares = [args.requests // args.processes + (i < args.requests % args.processes) for i in range(args.processes)]
+        processes = [
+            context.Process(target=worker, args=(user_id, share, args.amount, barrier, results))
+            for share in shares
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        balances = [balance for worker_balances, _, _ in outcomes for balance in worker_balances]
+        errors = [error for _, worker_errors, _ in outcomes for error in worker_errors]
+        elapsed = max(worker_elapsed for _, _, worker_elapsed in outcomes)
+        balance, ledger_rows, ledger_total = asyncio.run(inspect_and_remove_user(user_id))
+    finally:
+        if db_dir:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    # Repeated float subtraction, exactly as the database does it
+    expected_successes, remaining = 0, args.balance
+    while expected_successes < args.requests and remaining >= args.amount:
+        remaining -= args.amount
+        expected_successes += 1
+
+    print(f"{args.requests} deductions of {args.amount} from {args.balance} over {args.processes} processes in {elapsed * 1000:.0f} ms")
+    print(f"succeeded: {len(balances)}, refused: {args.requests - len(balances) - len(errors)}, errors: {len(errors)}")
+    print(f"final balance: {balance}, ledger: {ledger_rows} usage rows totalling {ledger_total}")
+
+    checks = {
+        "no errors": not errors,
+        "balance never negative": balance >= 0 and all(value >= 0 for value in balances),
+        "successes match the balance": len(balances) == expected_successes,
+        "every success saw a distinct balance": len(set(balances)) == len(balances),
+        "final balance matches the successes": abs(balance - (args.balance - len(balances) * args.amount)) < 1e-6,
+        "one ledger row per success": ledger_rows == len(balances),
+        "ledger total matches the deductions": abs(ledger_total + len(balances) * args.amount) < 1e-6,
+    }
+    for name, passed in checks.items():
+        print(f"  {'ok  ' if passed else 'FAIL'} {name}")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Bulk notification fan-out timing.
+
+Seeds N users in a throwaway SQLite database and times
+NotificationService.create_notifications_bulk for all of them, including the
+counter updates and the real-time push (no sockets are connected, so the push
+cost is encoding plus the broadcast backend). --compare also times the old
+one-commit-per-row path on a sample and extrapolates it.
+
+    cd backend && python benchmarks/notification_fanout.py --recipients 10000 --compare 500
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so the environment has to be set first
+_db_dir = tempfile.mkdtemp(prefix="groupchat-bench-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["BROADCAST_BACKEND"] = "memory"
+
+from sqlalchemy import insert
+
+from app.core.database import AsyncSessionLocal, dispose_engines, engine
+from app.core.migrations import upgrade_to_head
+from app.models import User
+from app.schemas.notification import NotificationCreate
+from app.services.notification_service import NotificationService
+# Imported by the app at startup; load it here so the first round does not pay for it
+from app.services.websocket_manager import manager  # noqa: F401
+
+
+async def run(args):
+    await upgrade_to_head(engine)
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": i, "email": f"user{i}@bench.local", "username": f"user{i}", "hashed_password": "x"}
+            for i in range(1, args.recipients + 1)
+        ])
+        await db.commit()
+
+    user_ids = list(range(1, args.recipients + 1))
+    for round_number in range(1, args.rounds + 1):
+        async with AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            created = await NotificationService(db).create_notifications_bulk(
+                user_ids, "system", "Announcement", f"Round {round_number}", data={"round": round_number}
+            )
+            elapsed = time.perf_counter() - start
+        print(f"bulk:     {created} notifications in {elapsed * 1000:.0f} ms")
+
+    if args.compare:
+        async with AsyncSessionLocal() as db:
+            service = NotificationService(db)
+            start = time.perf_counter()
+            for user_id in user_ids[:args.compare]:
+                await service.create_notification(NotificationCreate(
+                    type="system", title="Announcement", message="One by one", user_id=user_id
+                ))
+            elapsed = time.perf_counter() - start
+        print(f"per-row:  {args.compare} notifications in {elapsed * 1000:.0f} ms "
+              f"(~{elapsed / args.compare * args.recipients:.1f} s for {args.recipients})")
+
+    await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--compare", type=int, default=0, help="also time this many single creates")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
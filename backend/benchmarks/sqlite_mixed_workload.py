@@ -0,0 +1,160 @@
+"""Mixed read/write throughput on SQLite, default engine vs SQLITE_PERFORMANCE_MODE.
+
+Each run starts several worker processes (like uvicorn workers) on one
+database file. Every worker runs concurrent tasks that either post a
+message (message_ingest.submit; the buffer is not started, so every
+message is its own write transaction) or read a history page
+(MessageService.get_group_messages on the read session).
+
+    cd backend && python benchmarks/sqlite_mixed_workload.py --processes 4 --tasks 16 --write-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def prepare(group_id: int, users: int, messages: int):
+    """Migrate a fresh database and seed one busy group"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from app.core.database import AsyncSessionLocal, engine
+    from app.core.migrations import upgrade_to_head
+    from app.models import ChatGroup, GroupMember, Message, User
+
+    await upgrade_to_head(engine)
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": i, "email": f"user{i}@bench.local", "username": f"user{i}", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ])
+        await db.execute(insert(ChatGroup), [{"id": group_id, "name": "bench", "creator_id": 1, "member_count": users}])
+        await db.execute(insert(GroupMember), [{"user_id": i, "group_id": group_id} for i in range(1, users + 1)])
+        start = datetime.utcnow() - timedelta(days=1)
+        await db.execute(insert(Message), [
+            {"content": f"history {i}", "user_id": i % users + 1, "group_id": group_id,
+             "is_ai_message": False, "created_at": start + timedelta(seconds=i)}
+            for i in range(messages)
+        ])
+        await db.commit()
+    await engine.dispose()
+
+
+async def work(args) -> dict:
+    """One worker process: mixed traffic for args.duration seconds"""
+    import random
+    from app.core.database import AsyncReadSessionLocal, dispose_engines
+    from app.services.message_ingest import message_ingest
+    from app.services.message_service import MessageService
+
+    rng = random.Random(os.getpid())
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    latencies = {"reads": [], "writes": []}
+    errors = {}
+    deadline = time.perf_counter() + args.duration
+
+    async def task():
+        while time.perf_counter() < deadline:
+            kind = "writes" if rng.random() < args.write_ratio else "reads"
+            start = time.perf_counter()
+            try:
+                if kind == "writes":
+                    await message_ingest.submit(rng.randint(1, args.users), args.group_id, "bench")
+                else:
+                    async with AsyncReadSessionLocal() as db:
+                        await MessageService(db).get_group_messages(args.group_id, 50)
+            except Exception as e:
+                counts["errors"] += 1
+                key = str(e).splitlines()[0][:80]
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            counts[kind] += 1
+            latencies[kind].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(task() for _ in range(args.tasks)))
+    await dispose_engines()
+    return {"counts": counts, "latencies": latencies, "errors": errors}
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_mode(args, performance: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite+aiosqlite:///{tmp}/bench.db",
+            SQLITE_PERFORMANCE_MODE="true" if performance else "false",
+        )
+        worker_args = [
+            "--group-id", str(args.group_id), "--users", str(args.users), "--tasks", str(args.tasks),
+            "--duration", str(args.duration), "--write-ratio", str(args.write_ratio),
+        ]
+        subprocess.run([sys.executable, __file__, "--prepare", "--messages", str(args.messages), *worker_args],
+                       env=env, cwd=BACKEND_DIR, check=True)
+
+        workers = [
+            subprocess.Popen([sys.executable, __file__, "--worker", *worker_args],
+                             env=env, cwd=BACKEND_DIR, stdout=subprocess.PIPE)
+            for _ in range(args.processes)
+        ]
+        results = [json.loads(worker.communicate()[0].decode().strip().splitlines()[-1]) for worker in workers]
+
+    totals = {"reads": 0, "writes": 0, "errors": 0}
+    latencies = {"reads": [], "writes": []}
+    errors = {}
+    for result in results:
+        for key in totals:
+            totals[key] += result["counts"][key]
+        for key in latencies:
+            latencies[key] += result["latencies"][key]
+        for key, count in result["errors"].items():
+            errors[key] = errors.get(key, 0) + count
+
+    label = "performance mode" if performance else "default engine"
+    print(f"{label}:")
+    for kind in ("reads", "writes"):
+        ms = [latency * 1000 for latency in latencies[kind]]
+        print(f"  {kind:<7} {totals[kind] / args.duration:8.0f}/s   p50 {percentile(ms, 50):7.1f} ms   "
+              f"p99 {percentile(ms, 99):7.1f} ms")
+    print(f"  errors  {totals['errors']}")
+    for key, count in sorted(errors.items(), key=lambda item: -item[1]):
+        print(f"    {count} x {key}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=16, help="concurrent tasks per process")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--messages", type=int, default=20000, help="history rows seeded before the run")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--group-id", type=int, default=1)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        asyncio.run(prepare(args.group_id, args.users, args.messages))
+    elif args.worker:
+        print(json.dumps(asyncio.run(work(args))))
+    else:
+        print(f"{args.processes} processes x {args.tasks} tasks, {args.write_ratio:.0%} writes, {args.duration:.0f} s")
+        run_mode(args, performance=False)
+        run_mode(args, performance=True)
+
+
+if __name__ == "__main__":
+    main()
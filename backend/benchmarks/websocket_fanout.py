@@ -0,0 +1,282 @@
+"""WebSocket fan-out load test.
+
+Starts the FastAPI app in-process against a throwaway SQLite database and
+drives N simulated clients spread over M groups through the real /ws route
+(handshake, token check, join, send_message, typing). Clients speak ASGI
+directly instead of TCP, so 10k sockets fit in one process and the numbers
+reflect ConnectionManager rather than the network stack.
+
+Reports delivery latency percentiles (send_message frame in, new_message
+frame out), CPU spent delivering broadcasts, and memory per connection.
+
+    cd backend && python benchmarks/websocket_fanout.py --clients 10000 --groups 10 \\
+        --message-rate 20 --typing-rate 200 --duration 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so the environment has to be set first
+_db_dir = tempfile.mkdtemp(prefix="groupchat-bench-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["BROADCAST_BACKEND"] = "memory"
+os.environ["PRESENCE_BACKEND"] = "memory"
+os.environ["WEBSOCKET_GATEWAY"] = "false"
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.core.migrations import upgrade_to_head
+from app.core.security import create_access_token
+from app.core.serialization import dumps, loads
+from app.main import app
+from app.models import ChatGroup, GroupMember, User
+from app.services.websocket_manager import manager
+
+
+class SimulatedClient:
+    """One WebSocket client talking to the ASGI app without a network"""
+
+    def __init__(self, user_id: int, group_id: int, stats: "Stats"):
+        self.user_id = user_id
+        self.group_id = group_id
+        self.stats = stats
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.confirmed = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        token = create_access_token({"sub": str(self.user_id)})
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": f"/ws/{token}",
+            "raw_path": f"/ws/{token}".encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 10000 + self.user_id),
+            "server": ("localhost", 8000),
+            "subprotocols": [],
+        }
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(app(scope, self.inbox.get, self._on_send))
+
+    def send(self, frame: dict):
+        self.inbox.put_nowait({"type": "websocket.receive", "text": dumps(frame)})
+
+    def close(self):
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+    async def _on_send(self, message: dict):
+        if message["type"] != "websocket.send":
+            if message["type"] == "websocket.close":
+                self.stats.closed_by_server += 1
+            return
+
+        text = message.get("text")
+        if text is None:
+            return
+        if text.startswith('{"type":"new_message"'):
+            sent_at = float(loads(text)["message"]["content"])
+            self.stats.latencies.append(time.perf_counter() - sent_at)
+        elif text.startswith('{"type":"typing_update"'):
+            self.stats.typing_updates += 1
+        elif text.startswith('{"type":"message_ack"'):
+            self.stats.acks += 1
+        elif text.startswith('{"type":"connection_confirmed"'):
+            self.confirmed.set()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.typing_updates = 0
+        self.acks = 0
+        self.closed_by_server = 0
+        self.fanout_cpu = 0.0
+        self.broadcasts = 0
+
+
+async def seed(clients: int, groups: int):
+    """Users 1..clients, spread round-robin over groups 1..groups"""
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": i, "email": f"user{i}@bench.local", "username": f"user{i}", "hashed_password": "x"}
+            for i in range(1, clients + 1)
+        ])
+        await db.execute(insert(ChatGroup), [
+            {"id": g, "name": f"group {g}", "creator_id": 1, "max_members": clients, "member_count": len(range(g, clients + 1, groups))}
+            for g in range(1, groups + 1)
+        ])
+        await db.execute(insert(GroupMember), [
+            {"user_id": i, "group_id": (i - 1) % groups + 1}
+            for i in range(1, clients + 1)
+        ])
+        await db.commit()
+
+
+def time_fanout(stats: Stats):
+    """Measure CPU time of every local delivery of a group frame"""
+    deliver = manager._deliver_to_group
+
+    async def timed_deliver(group_id, frame, exclude_user=None):
+        start = time.process_time()
+        await deliver(group_id, frame, exclude_user)
+        stats.fanout_cpu += time.process_time() - start
+        stats.broadcasts += 1
+
+    manager.backend.set_handler(timed_deliver)
+
+
+async def connect_all(clients, batch: int, trace: bool):
+    """Open every client, batch by batch; returns traced bytes allocated if tracing"""
+    if trace:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(0, len(clients), batch):
+        chunk = clients[i:i + batch]
+        for client in chunk:
+            client.start()
+        await asyncio.gather(*(client.confirmed.wait() for client in chunk))
+    for client in clients:
+        client.send({"type": "join_group", "group_id": client.group_id})
+    while sum(len(contexts) for contexts in manager.group_connections.values()) < len(clients):
+        await asyncio.sleep(0.05)
+    if not trace:
+        return None
+    allocated = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return allocated
+
+
+async def drive(clients, args, stats: Stats) -> int:
+    """Send messages and typing frames at the requested rates; returns messages sent"""
+    sent = 0
+    message_budget = typing_budget = 0.0
+    last = time.perf_counter()
+    deadline = last + args.duration
+    while last < deadline:
+        # Budget by elapsed time so a busy event loop does not lower the rate
+        now = time.perf_counter()
+        message_budget += args.message_rate * (now - last)
+        typing_budget += args.typing_rate * (now - last)
+        last = now
+        while message_budget >= 1:
+            message_budget -= 1
+            sender = random.choice(clients)
+            sender.send({
+                "type": "send_message",
+                "group_id": sender.group_id,
+                "content": repr(time.perf_counter()),
+                "client_id": sent,
+            })
+            sent += 1
+        while typing_budget >= 1:
+            typing_budget -= 1
+            typist = random.choice(clients)
+            typist.send({"type": "typing", "group_id": typist.group_id})
+        await asyncio.sleep(0.01)
+    return sent
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args):
+    stats = Stats()
+    random.seed(args.seed)
+    if settings.WS_IDLE_TIMEOUT_SECONDS > 0:
+        # Simulated clients stay quiet between sends; do not reap them mid-run
+        settings.WS_IDLE_TIMEOUT_SECONDS = max(settings.WS_IDLE_TIMEOUT_SECONDS, args.duration * 10)
+
+    await upgrade_to_head(engine)
+    async with app.router.lifespan_context(app):
+        await seed(args.clients, args.groups)
+        time_fanout(stats)
+
+        clients = [SimulatedClient(i, (i - 1) % args.groups + 1, stats) for i in range(1, args.clients + 1)]
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        connect_start = time.perf_counter()
+        traced = await connect_all(clients, args.connect_batch, args.tracemalloc)
+        connect_time = time.perf_counter() - connect_start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        sent = await drive(clients, args, stats)
+
+        # Each message reaches every other member of the sender's group
+        group_size = args.clients / args.groups
+        expected = int(sent * (group_size - 1))
+        drain_deadline = time.perf_counter() + args.drain
+        while (len(stats.latencies) < expected or stats.acks < sent) and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.05)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+
+        manager_stats = manager.get_stats()
+        for client in clients:
+            client.close()
+        await asyncio.gather(*(client.task for client in clients), return_exceptions=True)
+
+    latencies_ms = [latency * 1000 for latency in stats.latencies]
+    print(f"clients / groups:        {args.clients} / {args.groups} (~{group_size:.0f} per group)")
+    print(f"connect:                 {connect_time:.2f} s")
+    # ru_maxrss is in KiB on Linux; tracemalloc inflates it, so report one or the other
+    if traced is None:
+        print(f"memory per connection:   {(rss_after - rss_before) / args.clients:.1f} KiB max RSS growth")
+    else:
+        print(f"memory per connection:   {traced / args.clients / 1024:.1f} KiB traced")
+    print(f"messages sent / acked:   {sent} / {stats.acks}")
+    print(f"deliveries:              {len(latencies_ms)} of {expected} expected")
+    print(f"typing updates received: {stats.typing_updates}")
+    print(f"latency p50/p90/p99/max: {percentile(latencies_ms, 50):.1f} / {percentile(latencies_ms, 90):.1f} / "
+          f"{percentile(latencies_ms, 99):.1f} / {max(latencies_ms, default=float('nan')):.1f} ms")
+    print(f"fan-out CPU:             {stats.fanout_cpu * 1000 / max(stats.broadcasts, 1):.3f} ms / broadcast "
+          f"({stats.broadcasts} broadcasts)")
+    print(f"process CPU:             {cpu:.2f} s over {wall:.2f} s wall")
+    print(f"dropped slow / reaped:   {manager_stats['dropped_slow']} / {manager_stats['reaped_idle']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--message-rate", type=float, default=20, help="messages per second, all groups")
+    parser.add_argument("--typing-rate", type=float, default=100, help="typing frames per second, all groups")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic")
+    parser.add_argument("--drain", type=float, default=10, help="seconds to wait for late deliveries")
+    parser.add_argument("--connect-batch", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="measure memory with tracemalloc instead of RSS")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger("app").setLevel(args.log_level)
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+#!/bin/sh
+# Bring the schema to the latest migration before starting the command; the app
+# refuses to start against an older one. Set RUN_MIGRATIONS=false for extra
+# replicas or the WebSocket gateway when another container migrates.
+set -e
+
+if [ "${RUN_MIGRATIONS:-true}" = "true" ]; then
+    # Databases created before migrations existed have no alembic_version yet
+    python scripts/stamp_baseline.py
+    alembic upgrade head
+fi
+
+# uvicorn only reads WebSocket options from its command line; pass the ones from
+# settings (environment or .env) first so flags given in the command still win
+if [ "$1" = "uvicorn" ]; then
+    shift
+    ws_options=$(python -c "from app.core.config import settings as s; print(f'--ws-ping-interval {s.WS_PING_INTERVAL_SECONDS} --ws-ping-timeout {s.WS_PING_TIMEOUT_SECONDS} --ws-per-message-deflate {str(s.WS_PER_MESSAGE_DEFLATE).lower()}')")
+    # Word splitting of ws_options is intended
+    set -- uvicorn $ws_options "$@"
+fi
+
+exec "$@"
@@ -0,0 +1,43 @@
+"""Move old chat messages from the messages table into the cold tier
+
+Messages older than MESSAGE_ARCHIVE_AFTER_DAYS (or --older-than-days) are
+written to compressed per-group segment files under MESSAGE_ARCHIVE_DIR and
+then deleted from the table in small batches. History endpoints keep serving
+them from the segments. Safe to re-run after an interruption; run it from cron
+on a host that shares MESSAGE_ARCHIVE_DIR with the API workers:
+
+    cd backend && python scripts/archive_messages.py
+    cd backend && python scripts/archive_messages.py --older-than-days 365
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.database import dispose_engines
+from app.services.message_archive import MessageArchiver, cold_store
+
+
+async def run(older_than_days: int):
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    stats = await MessageArchiver(cold_store).archive(cutoff)
+    await dispose_engines()
+    return cutoff, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--older-than-days", type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+
+    cutoff, stats = asyncio.run(run(args.older_than_days))
+    print(f"Archived {stats['archived']} messages created before {cutoff:%Y-%m-%d %H:%M} "
+          f"from {stats['groups']} group(s); deleted {stats['deleted']} from the messages table")
+
+
+if __name__ == "__main__":
+    main()
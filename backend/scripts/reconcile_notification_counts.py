@@ -0,0 +1,39 @@
+"""Repair drift in the denormalized notification counters
+
+users.notification_count and users.unread_notification_count are maintained
+by NotificationService. Rows changed outside it (manual SQL, restores, a
+crash between statements on a non-transactional store) leave them wrong, so
+run this periodically, e.g. nightly from cron:
+
+    cd backend && python scripts/reconcile_notification_counts.py
+    cd backend && python scripts/reconcile_notification_counts.py --user-id 42 --user-id 43
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import AsyncSessionLocal, dispose_engines
+from app.services.notification_service import NotificationService
+
+
+async def run(user_ids):
+    async with AsyncSessionLocal() as db:
+        repaired = await NotificationService(db).reconcile_counts(user_ids)
+    await dispose_engines()
+    return repaired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int, action="append", help="only these users (repeatable)")
+    args = parser.parse_args()
+
+    repaired = asyncio.run(run(args.user_id))
+    print(f"Repaired notification counters for {repaired} user(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Mark a database created by Base.metadata.create_all as migration 0001
+
+Databases from before Alembic have every baseline table but no
+alembic_version row, so ``alembic upgrade head`` would fail creating tables
+that already exist. This stamps them as 0001 first; fresh and already
+versioned databases are left unchanged, so it is safe to run before every
+upgrade (the backend image's entrypoint does):
+
+    cd backend && python scripts/stamp_baseline.py && alembic upgrade head
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import dispose_engines, engine
+from app.core.migrations import BASELINE_REVISION, stamp_unversioned_baseline
+
+
+async def run() -> bool:
+    stamped = await stamp_unversioned_baseline(engine)
+    await dispose_engines()
+    return stamped
+
+
+def main():
+    if asyncio.run(run()):
+        print(f"Stamped the existing schema as revision {BASELINE_REVISION}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time, so the environment has to be set before app is imported
+_db_dir = tempfile.mkdtemp(prefix="groupchat-test-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/test.db"
+os.environ["BROADCAST_BACKEND"] = "memory"
+os.environ["PRESENCE_BACKEND"] = "memory"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def migrated_db():
+    """The test database at Alembic head; engines are disposed afterwards"""
+    from app.core.database import dispose_engines, engine
+    from app.core.migrations import upgrade_to_head
+
+    await upgrade_to_head(engine)
+    yield
+    await dispose_engines()
@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import AsyncSessionLocal
+from app.models import ChatGroup, Message, User
+from app.services.message_ingest import MessageIngestBuffer
+
+
+async def sender_and_group():
+    async with AsyncSessionLocal() as db:
+        token = uuid.uuid4().hex[:8]
+        user_id = (await db.execute(
+            insert(User).values(email=f"ingest-{token}@test.local", username=f"ingest-{token}", hashed_password="x")
+            .returning(User.id)
+        )).scalar_one()
+        group_id = (await db.execute(
+            insert(ChatGroup).values(name="ingest", creator_id=user_id).returning(ChatGroup.id)
+        )).scalar_one()
+        await db.commit()
+    return user_id, group_id
+
+
+@pytest.mark.asyncio
+async def test_cancelled_sender_still_gets_its_queued_message_written(migrated_db):
+    user_id, group_id = await sender_and_group()
+
+    buffer = MessageIngestBuffer(window_ms=50)
+    await buffer.start()
+    try:
+        sender = asyncio.create_task(buffer.submit(user_id, group_id, "sent while disconnecting"))
+        await asyncio.sleep(0)
+        sender.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await sender
+    finally:
+        await buffer.stop()
+
+    async with AsyncSessionLocal() as db:
+        contents = (await db.execute(select(Message.content).where(Message.group_id == group_id))).scalars().all()
+    assert contents == ["sent while disconnecting"]
+    assert buffer.stats["messages"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_row_only_fails_its_own_sender(migrated_db):
+    user_id, group_id = await sender_and_group()
+
+    buffer = MessageIngestBuffer(window_ms=50)
+    await buffer.start()
+    try:
+        contents = [f"message {i}" for i in range(7)]
+        contents[4] = None  # Violates NOT NULL, like a row whose group was just deleted
+        outcomes = await asyncio.gather(
+            *(buffer.submit(user_id, group_id, content) for content in contents),
+            return_exceptions=True
+        )
+    finally:
+        await buffer.stop()
+
+    assert isinstance(outcomes[4], IntegrityError)
+    assert [message.content for i, message in enumerate(outcomes) if i != 4] == [c for c in contents if c]
+    assert buffer.stats["failed_messages"] == 1
+    assert buffer.stats["split_batches"] >= 1
+    async with AsyncSessionLocal() as db:
+        stored = (await db.execute(select(Message.content).where(Message.group_id == group_id))).scalars().all()
+    assert sorted(stored) == sorted(c for c in contents if c)
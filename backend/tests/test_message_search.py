@@ -0,0 +1,57 @@
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from app.core.database import AsyncSessionLocal
+from app.models import ChatGroup, GroupMember, Message, User
+from app.services.message_search import MessageSearchService
+
+WORDS = ["deploy", "lunch", "meeting", "release", "review", "standup", "ticket", "build"]
+
+
+async def post(group_id: int, user_id: int, contents):
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Message), [
+            {"content": content, "user_id": user_id, "group_id": group_id, "is_ai_message": False}
+            for content in contents
+        ])
+        await db.commit()
+
+
+def chatter(rng: random.Random, count: int):
+    # Different lengths and term counts give every match its own bm25 score
+    return [
+        " ".join(["deploy"] * rng.randint(1, 3) + [rng.choice(WORDS) for _ in range(rng.randint(1, 40))])
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_relevance_pages_stay_consistent_while_matches_are_inserted(migrated_db):
+    rng = random.Random(7)
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(
+            insert(User).values(email="search@test.local", username="search", hashed_password="x").returning(User.id)
+        )).scalar_one()
+        group_id = (await db.execute(
+            insert(ChatGroup).values(name="search", creator_id=user_id).returning(ChatGroup.id)
+        )).scalar_one()
+        await db.execute(insert(GroupMember).values(user_id=user_id, group_id=group_id))
+        await db.commit()
+    await post(group_id, user_id, chatter(rng, 120) + [" ".join(rng.choices(WORDS[1:], k=10)) for _ in range(80)])
+
+    seen, cursor = [], None
+    while True:
+        async with AsyncSessionLocal() as db:
+            hits, cursor = await MessageSearchService(db).search(
+                user_id, "deploy", group_id=group_id, cursor=cursor, limit=7
+            )
+        seen.extend(message.id for message, _, _, _ in hits)
+        if cursor is None:
+            break
+        # Changes the corpus statistics every score is computed from
+        await post(group_id, user_id, chatter(rng, 15))
+
+    assert len(seen) == len(set(seen)), "a message was returned on two pages"
+    assert len(seen) == 120, "a message was skipped"
@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import pytest
+from alembic import command
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.migrations import (
+    BASELINE_REVISION, get_alembic_config, get_current_revision, get_head_revision,
+    stamp_unversioned_baseline, upgrade_to_head
+)
+
+
+async def unversioned_baseline(engine):
+    """The schema create_all used to build: 0001's tables, no alembic_version"""
+    def upgrade(sync_conn):
+        config = get_alembic_config()
+        config.attributes["connection"] = sync_conn
+        config.attributes["configure_logger"] = False
+        command.upgrade(config, BASELINE_REVISION)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        await conn.execute(text("DROP TABLE alembic_version"))
+        await conn.execute(text("INSERT INTO users (email, username) VALUES ('old@test.local', 'old')"))
+
+
+@pytest.fixture
+def scratch_engine():
+    path = os.path.join(tempfile.mkdtemp(prefix="groupchat-migrations-"), "scratch.db")
+    return create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+
+@pytest.mark.asyncio
+async def test_database_from_create_all_is_stamped_then_upgraded(scratch_engine):
+    await unversioned_baseline(scratch_engine)
+    try:
+        assert await stamp_unversioned_baseline(scratch_engine)
+        assert await get_current_revision(scratch_engine) == BASELINE_REVISION
+        await upgrade_to_head(scratch_engine)
+        assert await get_current_revision(scratch_engine) == get_head_revision()
+
+        # Versioned now, so later runs leave it alone
+        assert not await stamp_unversioned_baseline(scratch_engine)
+        async with scratch_engine.connect() as conn:
+            assert (await conn.execute(text("SELECT username FROM users"))).scalars().all() == ["old"]
+    finally:
+        await scratch_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_fresh_and_partial_databases_are_not_stamped(scratch_engine):
+    try:
+        assert not await stamp_unversioned_baseline(scratch_engine)
+        assert await get_current_revision(scratch_engine) is None
+
+        async with scratch_engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY)"))
+        with pytest.raises(RuntimeError):
+            await stamp_unversioned_baseline(scratch_engine)
+    finally:
+        await scratch_engine.dispose()
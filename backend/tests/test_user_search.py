@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import insert, select, update
+
+from app.core.database import AsyncSessionLocal
+from app.models import User
+from app.services.user_search import UserSearchService, user_search_index
+
+
+@pytest.mark.asyncio
+async def test_sqlite_search_finds_words_inside_usernames_and_emails(migrated_db):
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"email": "jsmith@corp.test", "username": "jsmith", "hashed_password": "x"},
+            {"email": "smithers@corp.test", "username": "smithers", "hashed_password": "x"},
+            {"email": "kwong@blacksmiths.test", "username": "kwong", "hashed_password": "x"},
+            {"email": "searcher@corp.test", "username": "searcher", "hashed_password": "x"},
+        ])
+        await db.commit()
+
+    async def usernames(query):
+        async with AsyncSessionLocal() as db:
+            searcher = await db.scalar(select(User.id).where(User.username == "searcher"))
+            return [user.username for user, _ in await UserSearchService(db).search(searcher, query)]
+
+    # While the in-memory index builds only username prefixes match
+    assert await usernames("smith") == ["smithers"]
+
+    # Prefix matches first, then shorter usernames
+    await user_search_index._refresh()
+    assert user_search_index.search("smith", 10) is not None
+    assert await usernames("smith") == ["smithers", "kwong", "jsmith"]
+    assert await usernames("mith") == ["kwong", "jsmith", "smithers"]
+    # Only the email domain contains the whole word
+    assert await usernames("smiths") == ["kwong"]
+
+    # Renames reach the trigrams on the next refresh
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(User).where(User.username == "jsmith").values(username="jdoe", email="jdoe@corp.test"))
+        await db.commit()
+    await user_search_index._refresh()
+    assert await usernames("smith") == ["smithers", "kwong"]
+    assert await usernames("jdo") == ["jdoe"]
+    assert await usernames("doe") == ["jdoe"]
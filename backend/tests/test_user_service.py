@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.database import AsyncSessionLocal
+from app.models import CreditTransaction, User
+from app.services.user_service import UserService
+
+
+@pytest.mark.asyncio
+async def test_refused_deduction_ends_its_transaction(migrated_db):
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(
+            insert(User).values(email="credits@test.local", username="credits", hashed_password="x", credits=1.0)
+            .returning(User.id)
+        )).scalar_one()
+        await db.commit()
+
+        service = UserService(db)
+        assert await service.deduct_credits(user_id, 1.0) == 0.0
+        assert await service.deduct_credits(user_id, 1.0) is None
+        # On SQLite the write lock would otherwise be held for the rest of the request
+        assert not db.in_transaction()
+
+        usage = (await db.execute(
+            select(CreditTransaction.amount).where(CreditTransaction.user_id == user_id)
+        )).scalars().all()
+        assert usage == [-1.0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deductions_never_overdraw(migrated_db):
+    requests, amount, balance = 25, 1.0, 7.0
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(
+            insert(User).values(email="race@test.local", username="race", hashed_password="x", credits=balance)
+            .returning(User.id)
+        )).scalar_one()
+        await db.commit()
+
+    async def deduct():
+        # One session each, like concurrent requests
+        async with AsyncSessionLocal() as db:
+            return await UserService(db).deduct_credits(user_id, amount, description="race")
+
+    outcomes = await asyncio.gather(*(deduct() for _ in range(requests)))
+    successes = [remaining for remaining in outcomes if remaining is not None]
+
+    assert len(successes) == int(balance // amount)
+    assert all(remaining >= 0 for remaining in successes)
+    # Each success saw its own balance, so none were lost updates
+    assert sorted(successes) == [balance - amount * i for i in range(len(successes), 0, -1)]
+
+    async with AsyncSessionLocal() as db:
+        final = (await db.execute(select(User.credits).where(User.id == user_id))).scalar_one()
+        usage = (await db.execute(
+            select(CreditTransaction.amount)
+            .where(CreditTransaction.user_id == user_id, CreditTransaction.transaction_type == "usage")
+        )).scalars().all()
+    assert final == balance - amount * len(successes) >= 0
+    assert usage == [-amount] * len(successes)
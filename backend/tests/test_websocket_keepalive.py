@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.schemas.websocket import inbound_frame_adapter
+from app.services.websocket_manager import ConnectionContext, ConnectionManager
+
+
+class FakeWebSocket:
+    """Collects frames the writer task sends"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def connected(manager: ConnectionManager, user_id: int, group_id: int) -> ConnectionContext:
+    context = ConnectionContext(FakeWebSocket(), user_id)
+    manager._register(context)
+    manager._start_writer(context)
+    await manager.join_group(context, group_id)
+    return context
+
+
+@pytest.mark.asyncio
+async def test_reading_only_connection_survives_past_idle_timeout():
+    manager = ConnectionManager()
+    await manager.start()
+    try:
+        reader = await connected(manager, user_id=1, group_id=7)
+        assert manager._reaper_task is None
+
+        for i in range(3):
+            await manager.send_to_group(7, {"type": "new_message", "message": {"id": i}})
+        await asyncio.sleep(0.01)
+
+        # Far beyond any timeout, and the reader has never sent a frame
+        later = time.monotonic() + 10 * (settings.WS_PING_INTERVAL_SECONDS + settings.WS_PING_TIMEOUT_SECONDS + 75)
+        assert manager.reap_idle(now=later) == 0
+        await asyncio.sleep(0.01)
+
+        assert not reader.closed
+        assert reader in manager.group_connections[7]
+        assert len(reader.websocket.sent) == 3
+        assert reader.websocket.closed_with is None
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_opt_in_reaping_closes_silent_sockets_and_keeps_ponging_ones(monkeypatch):
+    monkeypatch.setattr(settings, "WS_IDLE_TIMEOUT_SECONDS", 75)
+    manager = ConnectionManager()
+    silent = await connected(manager, user_id=1, group_id=7)
+    answering = await connected(manager, user_id=2, group_id=7)
+
+    start = time.monotonic()
+    assert manager.reap_idle(now=start + settings.WS_PING_INTERVAL_SECONDS) == 0
+    await asyncio.sleep(0.01)
+    assert any("ping" in frame for frame in silent.websocket.sent)
+
+    # The listener refreshes last_activity for every inbound frame, then handles it
+    answering.last_activity = start + 60
+    await manager.handle_message(answering, inbound_frame_adapter.validate_python({"type": "pong"}))
+
+    assert manager.reap_idle(now=start + 80) == 1
+    await asyncio.sleep(0.01)
+    assert silent.websocket.closed_with == 4000
+    assert silent not in manager.group_connections.get(7, set())
+    assert not answering.closed
+    assert manager.stats["reaped_idle"] == 1
+
+    await manager.disconnect(answering)
+
+
+@pytest.mark.asyncio
+async def test_reaper_closes_are_tracked_until_stop(monkeypatch):
+    monkeypatch.setattr(settings, "WS_IDLE_TIMEOUT_SECONDS", 75)
+    manager = ConnectionManager()
+    silent = await connected(manager, user_id=1, group_id=7)
+    silent.last_activity = -10.0
+
+    # An explicit clock of 0.0 is a time, not a missing argument
+    assert manager.reap_idle(now=0.0) == 0
+    assert manager.reap_idle(now=100.0) == 1
+    assert len(manager._background_tasks) == 1
+
+    await manager.stop()
+    assert silent.websocket.closed_with == 4000
+    assert not manager._background_tasks